@@ -34,9 +34,100 @@ fluctuations from the mean and their correlation time. The parameters
 for the calculations of the correlation time are set with
 :meth:`XVG.set_correlparameters`.
 
+Alternatively, :attr:`XVG.error_blocking` estimates the error with the
+block averaging method of Flyvbjerg and Petersen (see
+:meth:`XVG.block_average`), which does not assume a particular form of
+the autocorrelation function.
+
 .. SeeAlso:: :func:`numkit.timeseries.tcorrel`
 
 
+Caching of parsed data
+----------------------
+
+Parsing a large xvg file can take a long time. With the *cache*
+keyword (``XVG(filename, cache=True)``) the parsed array is stored as a
+NumPy ``.npy`` file next to the xvg file (or in the directory given as
+*cache*) together with a small JSON file that contains the metadata
+from the header. Any later instance (also in another process) that
+reads the same file with the same *stride* simply memory-maps the
+``.npy`` file (see :func:`numpy.load` with ``mmap_mode='r'``) instead of
+parsing the xvg file again. The cache is ignored and rewritten whenever
+the modification time or the size of the xvg file changed.
+
+.. Note:: The memory-mapped array is read-only.
+
+Very large uncompressed files can also be parsed with several
+processes (``XVG(filename, nprocs=8)``): the data section is split
+into byte ranges at line boundaries and every worker converts its
+range directly into a shared output array. The result (including
+:attr:`XVG.corrupted_lineno`) is the same as with a single process.
+Parallel parsing requires the ``fork`` start method of
+:mod:`multiprocessing`, i.e. it is only available on Unix-like systems.
+
+
+Following files that are being written
+--------------------------------------
+
+Output files of running simulations or analysis tools can be followed
+with :meth:`XVG.refresh`: the first call reads the data that are
+currently in the file and every further call only parses the lines
+that were appended since the previous call, i.e. the cost scales with
+the amount of new data and not with the size of the file::
+
+  xvg = XVG("energy.xvg")
+  xvg.refresh()
+  ...
+  nnew = xvg.refresh()   # only reads new lines
+
+A trailing line without a newline is considered incomplete and left
+for the next call.
+
+
+Reading a time window
+---------------------
+
+A window of a large file can be read with :meth:`XVG.read_window`
+without parsing the whole file::
+
+  xvg = XVG("energy.xvg")
+  a = xvg.read_window(50000, 60000)   # 50 ns <= t <= 60 ns
+
+The byte offsets of every :attr:`XVG.index_interval`'th line are
+recorded in an index file ``energy.xvg.idx.npz`` by a single scan over
+the file (see :meth:`XVG.build_index`); it is reused until the xvg
+file changes.
+
+The metadata of a file (legends, axis labels, number of columns, first
+and last time and the approximate number of rows) can be obtained
+without reading the data at all with :meth:`XVG.peek`::
+
+  info = XVG.peek("energy.xvg")
+  print(info['names'], info['t_last'])
+
+
+Pickling and saving
+-------------------
+
+:class:`XVG` instances can be pickled; the data are only included with
+*savedata* = ``True``. With pickle protocol 5 the array is passed as
+an out-of-band buffer, i.e. it is not copied into the pickle::
+
+  buffers = []
+  s = pickle.dumps(xvg, protocol=5, buffer_callback=buffers.append)
+  xvg2 = pickle.loads(s, buffers=buffers)   # shares the data with xvg
+
+Derived arrays (such as :attr:`XVG.ma`) and autocorrelation functions
+are never pickled because they are quickly recomputed.
+
+:meth:`XVG.save_npz` stores the data, the metadata and any statistics
+that were already computed in a NumPy ``.npz`` file that does not
+contain any pickled objects; :meth:`XVG.load_npz` restores the instance::
+
+  xvg.save_npz("energy.npz")
+  xvg = XVG.load_npz("energy.npz")
+
+
 Plotting
 --------
 
@@ -78,15 +169,16 @@ It is also possible to *coarse grain the data* for plotting (which
 typically results in visually smoothing the graph because noise is
 averaged out).
 
-Currently, two alternative algorithms to produce "coarse grained"
-(decimated) graphs are implemented and can be selected with the
-*method* keyword for the plotting functions in conjuction with
-*maxpoints* (the number of points to be plotted):
+Several algorithms to produce "coarse grained" (decimated) graphs
+are implemented and can be selected with the *method* keyword for the
+plotting functions in conjuction with *maxpoints* (the number of
+points to be plotted), in particular:
 
-1) **mean** histogram (default) --- bin the data (using
-   :func:`numkit.timeseries.regularized_function` and compute the
-   mean for each bin. Gives the exact number of desired points
-   but the time data are whatever the middle of the bin is.
+1) **mean** histogram (default) --- bin the data (in the same way as
+   :func:`numkit.timeseries.regularized_function`, but for all columns
+   at once) and compute the mean for each bin. Gives the exact number
+   of desired points but the time data are whatever the middle of the
+   bin is.
 
 2) **smooth** subsampled --- smooth the data with a running average
    (other windows like Hamming are also possible) and then pick data
@@ -94,7 +186,16 @@ Currently, two alternative algorithms to produce "coarse grained"
    required. Will give exact times but not the exact number of data
    points.
 
-For simple test data, both approaches give very similar output.
+3) **lttb** (Largest-Triangle-Three-Buckets) --- select *maxpoints*
+   of the original data points that preserve the visual shape of the
+   graph, including spikes.
+
+4) **minmax** envelope --- the minimum and the maximum in each of
+   *maxpoints*/2 bins, so that no excursion of the data is hidden.
+
+For simple test data, the mean and smooth approaches give very similar
+output. Averaging removes spikes and transitions that "lttb" and
+"minmax" keep.
 
 For the special case of periodic data such as angles, one can use the
 circular mean ("circmean") to coarse grain. In this case, jumps across
@@ -184,7 +285,11 @@ Classes and functions
 .. autoclass:: XVG
    :members:
 
+.. autofunction:: load_stacked
 .. autofunction:: break_array
+.. autofunction:: autocorrelation_fft
+.. autofunction:: statistical_inefficiency
+.. autofunction:: smooth
 
 """
 
@@ -193,13 +298,29 @@ Classes and functions
 
 import os, errno
 import re
+import itertools
+import functools
+import io
+import json
+import hashlib
 import warnings
-from collections import OrderedDict as odict
-
+import mmap
+import multiprocessing
+import gzip, bz2
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # Python 2 without the futures backport: XVG.write() compresses serially
+    ThreadPoolExecutor = None
+from collections import OrderedDict as odict, deque
+from contextlib import contextmanager
+
+import six
 import numpy
 
 from gromacs.exceptions import (ParseError, MissingDataError,
-                                MissingDataWarning, AutoCorrectionWarning)
+                                MissingDataWarning, AutoCorrectionWarning,
+                                LowAccuracyWarning)
 import gromacs.utilities as utilities
 import gromacs.collections
 
@@ -208,6 +329,17 @@ import numkit.timeseries
 import logging
 
 
+#: Line that only contains white space (except for the first line).
+_BLANK_LINE = re.compile(r'\n[ \t\r\f\v]*\n')
+
+# output array and instance of XVG._parse_parallel(), shared with the forked workers
+_parallel_output = None
+_parallel_xvg = None
+
+# data and statistic for XVG.bootstrap(), shared with the forked workers
+_bootstrap_args = None
+
+
 class XVG(utilities.FileUtils):
     """Class that represents the numerical data in a grace xvg file.
 
@@ -254,19 +386,57 @@ class XVG(utilities.FileUtils):
     #: Aim for plotting around that many points
     maxpoints_default = 10000
 
+    #: Number of lines that are read and converted in one go by :meth:`XVG.parse`
+    parse_blocksize = 65536
+
+    #: Number of bytes that are read in one go by :meth:`XVG.refresh`
+    refresh_readsize = 2**24
+
+    #: Number of lines between entries of the index used by :meth:`XVG.read_window`
+    index_interval = 10000
+
+    #: Number of rows that are formatted in one go by :meth:`XVG.write`
+    write_blocksize = 65536
+
+    #: Files smaller than this (in bytes) are not parsed in parallel
+    #: (see *nprocs* in :class:`XVG`)
+    parallel_minsize = 2**24
+
     # logger: for pickling to work, this *must* be class-level and
     # cannot be done in __init__() (because we cannot pickle self.logger)
     logger = logging.getLogger('gromacs.formats.XVG')
 
     #: If :attr:`XVG.savedata` is ``False`` then any attributes in
     #: :attr:`XVG.__pickle_excluded` are *not* pickled as they are but simply
-    #: pickled with the default value.
-    __pickle_excluded = {'__array': None}   # note class name un-mangling in __getstate__()!
+    #: pickled with the default value (``None`` for the caches, which are
+    #: recreated by :meth:`XVG.__setstate__`).
+    __pickle_excluded = {'__array': None, '__derived': None, '__cache': None}   # note class name un-mangling in __getstate__()!
+
+    # state of the file readers that is never pickled (the class defaults
+    # are used after unpickling): the buffer of XVG.refresh() and the
+    # index of XVG.read_window()
+    __pickle_dropped = ('__tail', '__index')
+
+    # statistics of the data columns that are pickled and saved (see XVG.save_npz())
+    _statistics = ('mean', 'std', 'min', 'max')
 
     #: Default color cycle for :meth:`XVG.plot_coarsened`:
     #: ``['black', 'red', 'blue', 'orange', 'magenta', 'cyan', 'yellow', 'brown', 'green']``
     default_color_cycle = ['black', 'red', 'blue', 'orange', 'magenta', 'cyan', 'yellow', 'brown', 'green']
 
+    # set to True once the header of the file has been read (class
+    # default so that instances from older pickles work)
+    __headerparsed = False
+
+    # state of the incremental reader XVG.refresh()
+    __tail = None
+
+    # nstep set with XVG.set_correlparameters()
+    __nstep = None
+
+    # sparse index of the file for XVG.read_window()
+    __index = None
+
     def __init__(self, filename=None, names=None, array=None, permissive=False, **kwargs):
         """Initialize the class from a xvg file.
 
@@ -297,10 +467,44 @@ class XVG(utilities.FileUtils):
                     those data from a pickle. [``False``]
               *metadata*
                     dictionary of metadata, which is not touched by the class
+              *streaming*
+                    ``True`` computes :attr:`XVG.mean`, :attr:`XVG.std`,
+                    :attr:`XVG.min` and :attr:`XVG.max` in a single pass
+                    over the file without loading all data into memory
+                    (unless the data were already loaded) [``False``]
+              *cache*
+                    ``True`` stores the parsed data as a ``.npy`` file next
+                    to *filename* and memory-maps it on subsequent reads;
+                    a directory name stores the cache files in this
+                    directory instead. ``False`` disables the cache. [``False``]
+              *nprocs*
+                    number of processes that parse the data section of
+                    uncompressed files in parallel; files smaller than
+                    :attr:`XVG.parallel_minsize` bytes are always parsed
+                    serially [1]
+              *dtype*
+                    numpy type of the parsed array, e.g. :class:`numpy.float32`
+                    to halve the memory use [``float``]
+              *usecols*
+                    list of the (0-based) indices of the columns that are
+                    read, e.g. ``[0, 3, 7]`` (include 0 for the time
+                    column); all other columns are neither converted nor
+                    stored (and data lines only need to contain the
+                    selected columns). The columns are read in the order
+                    in which they appear in the file and :attr:`XVG.names`
+                    only contains the legends of the selected data
+                    columns. ``None`` reads all columns. [``None``]
+              *packmask*
+                    ``True`` caches the mask of finite values (see
+                    :attr:`XVG.finite`) as a bit array, which needs 1/8
+                    of the memory of a boolean array but has to be
+                    unpacked on every access; :attr:`XVG.ma` is then not
+                    cached either. [``False``]
 
         """
         self.__array = None           # cache for array (BIG) (used by XVG.array)
         self.__cache = {}             # cache for computed results
+        self.__derived = {}           # cache for arrays derived from array (BIG)
         self.savedata = kwargs.pop('savedata', False)
         if filename is not None:
             self._init_filename(filename)  # note: reading data from file is delayed until required
@@ -314,6 +518,13 @@ class XVG(utilities.FileUtils):
         self.metadata = kwargs.pop('metadata', {})  # reserved for user data
         self.permissive = permissive
         self.stride = kwargs.pop('stride', 1)
+        self.cache = kwargs.pop('cache', False)
+        self.streaming = kwargs.pop('streaming', False)
+        self.nprocs = kwargs.pop('nprocs', 1)
+        self.dtype = kwargs.pop('dtype', float)
+        self.packmask = kwargs.pop('packmask', False)
+        usecols = kwargs.pop('usecols', None)
+        self.usecols = tuple(sorted(set(usecols))) if usecols is not None else None
         self.corrupted_lineno = None      # must parse() first before this makes sense
         # default number of data points for calculating correlation times via FFT
         self.ncorrel = kwargs.pop('ncorrel', 25000)
@@ -327,19 +538,126 @@ class XVG(utilities.FileUtils):
         self._init_filename(filename)
         self.parse()
 
-    def write(self, filename=None):
+    def write(self, filename=None, fmt="%-8s", threads=None):
         """Write array to xvg file *filename* in NXY format.
 
-        .. Note:: Only plain files working at the moment, not compressed.
+        The file is compressed with gzip, bzip2 or xz if *filename* ends
+        in ``.gz``, ``.bz2`` or ``.xz`` (same rules as for
+        :func:`gromacs.utilities.anyopen`). The legends (from
+        :attr:`XVG.names`) and axis labels are written as an xmgrace
+        header so that they are restored when the file is read again.
+        A :exc:`ValueError` is raised for ``.xz`` if :mod:`lzma` is not
+        available.
+
+        :Keywords:
+           *fmt*
+               format for a single number, e.g. ``"%.6g"`` or ``"%12.5f"``;
+               the default writes numbers with full precision ["%-8s"]
+           *threads*
+               compress with that many threads (only for compressed
+               files); the data are compressed in independent blocks,
+               which are written as consecutive gzip/bzip2/xz streams
+               (a valid file for all common tools); ignored if
+               :mod:`concurrent.futures` is not available [``None``]
+
+        The rows are formatted in blocks of :attr:`XVG.write_blocksize`
+        rows at a time.
         """
         self._init_filename(filename)
-        with utilities.openany(self.real_filename, 'w') as xvg:
-            xvg.write("# xmgrace compatible NXY data file\n"
-                      "# Written by gromacs.formats.XVG()\n")
-            xvg.write("# :columns: {0!r}\n".format(self.names))
-            for xyy in self.array.T:
-                xyy.tofile(xvg, sep=" ", format="%-8s")  # quick and dirty ascii output...--no compression!
-                xvg.write('\n')
+        if self.real_filename.endswith('.xz') and utilities.lzma is None:
+            raise ValueError("{0!s}: xz compression requires "
+                             "lzma.".format(self.real_filename))
+        a = self.array
+        blocks = itertools.chain([self._xmgrace_header(a)],
+                                 (_format_rows(a[:, i:i + self.write_blocksize].T, fmt)
+                                  for i in range(0, a.shape[-1], self.write_blocksize)))
+        blocks = (text.encode('utf-8') for text in blocks)
+        compress = _compressors.get(os.path.splitext(self.real_filename)[1][1:])
+        if threads and compress is not None and ThreadPoolExecutor is not None:
+            _write_threaded(self.real_filename, blocks, compress, threads)
+            return
+        with utilities.openany(self.real_filename, 'wb') as xvg:
+            for data in blocks:
+                xvg.write(data)
+
+    @classmethod
+    def merge(cls, files, filename=None, **kwargs):
+        """Merge the xvg files from a simulation that was run in parts.
+
+        Simulations that were continued with ``-noappend`` produce files
+        ``PREFIX.part0002.xvg``, ``PREFIX.part0003.xvg``, ... whose time
+        ranges can overlap (e.g. when a run was restarted from an older
+        checkpoint). The segments are merged in the order of *files*
+        (the order of the parts of the run): every segment replaces all
+        data of the previous segments from its first time onward, i.e.
+        for overlapping time ranges the data of the later part are kept.
+
+        The time (first column) must increase within each segment.
+
+        :Arguments:
+           *files*
+               list of xvg files in the order of the parts or a prefix; a
+               prefix ``PREFIX`` selects ``PREFIX.xvg`` followed by
+               ``PREFIX.partNNNN.xvg`` (see :func:`gromacs.cbook.glob_parts`)
+           *filename*
+               write the merged data to *filename* [``None``]
+           *kwargs*
+               keyword arguments for reading the segments with :class:`XVG`
+
+        :Returns: :class:`XVG` instance with the merged data
+        """
+        if isinstance(files, six.string_types):
+            from gromacs.cbook import glob_parts
+            first = files + os.extsep + cls.default_extension
+            # glob_parts() sorts PREFIX.xvg after the parts
+            files = sorted(glob_parts(files, cls.default_extension),
+                           key=lambda name: name != first)
+        segments = []
+        names = []
+        for name in files:
+            xvg = cls(name, **kwargs)
+            a = xvg.array
+            if a.size == 0:
+                xvg.logger.warning("%s: no data, skipped", name)
+                continue
+            if segments and len(a) != len(segments[0]):
+                raise ValueError("{0!s}: {1:d} columns but {2!s} has {3:d}".format(
+                    name, len(a), files[0], len(segments[0])))
+            segments.append(a)
+            names.append(xvg.names)
+        if not segments:
+            raise MissingDataError("No data in any of the files {0!r}".format(files))
+        pieces = []
+        for a in segments:
+            # drop all earlier data from the first time of this segment onward
+            while pieces and pieces[-1][0, 0] >= a[0, 0]:
+                pieces.pop()
+            if pieces:
+                last = pieces[-1]
+                pieces[-1] = last[:, :numpy.searchsorted(last[0], a[0, 0], side='left')]
+            pieces.append(a)
+        merged = cls(array=numpy.concatenate(pieces, axis=1), names=names[0])
+        merged.logger.info("Merged %d segments into %d rows", len(segments), merged.array.shape[1])
+        if filename is not None:
+            merged.write(filename)
+        return merged
+
+    def _xmgrace_header(self, a):
+        """Header with axis labels and legends for the array *a*."""
+        header = ["# xmgrace compatible NXY data file",
+                  "# Written by gromacs.formats.XVG()",
+                  "# :columns: {0!r}".format(self.names)]
+        for attr in 'xaxis', 'yaxis':
+            label = getattr(self, attr, None)
+            if label is not None:
+                header.append('@    {0}  label "{1}"'.format(attr, label))
+        header.append("@TYPE xy")
+        # names can include the first (x) column
+        ny = len(a) - 1 if a.ndim == 2 else 0
+        legends = self.names[-ny:] if ny > 0 and len(self.names) >= ny else self.names
+        for i, name in enumerate(legends):
+            header.append('@ s{0:d} legend "{1}"'.format(i, name))
+        return "\n".join(header) + "\n"
 
     @property
     def array(self):
@@ -360,42 +678,181 @@ class XVG(utilities.FileUtils):
         columns X Y1 Y2 Y3 ... the array a will be a[0] = X, a[1] = Y1, ... .
 
         inf and nan are filtered via :func:`numpy.isfinite`.
+
+        The masked array is cached (unless *packmask* is set, see
+        :class:`XVG`) and shares its data with :attr:`XVG.array`.
+        """
+        if self.packmask:
+            return numpy.ma.MaskedArray(self.array, mask=numpy.logical_not(self.finite))
+        return self._derived('ma', lambda: numpy.ma.MaskedArray(
+            self.array, mask=numpy.logical_not(self.finite)))
+
+    @property
+    def finite(self):
+        """Boolean array that is ``True`` where the data are finite (not inf or nan).
+
+        The mask is cached; with *packmask* = ``True`` (see :class:`XVG`)
+        it is stored with :func:`numpy.packbits` and unpacked on access.
         """
         a = self.array
-        return numpy.ma.MaskedArray(a, mask=numpy.logical_not(numpy.isfinite(a)))
+        if self.packmask:
+            bits = self._derived('finitebits', lambda: numpy.packbits(numpy.isfinite(a), axis=None))
+            return numpy.unpackbits(bits)[:a.size].reshape(a.shape).view(bool)
+        return self._derived('finite', lambda: numpy.isfinite(a))
 
     @property
     def mean(self):
         """Mean value of all data columns."""
-        return self.array[1:].mean(axis=1)
+        if self._use_streaming():
+            return self._online_stats()['mean']
+        return self._derived('mean', lambda: self.array[1:].mean(axis=1), readonly=True)
 
     @property
     def std(self):
         """Standard deviation from the mean of all data columns."""
-        return self.array[1:].std(axis=1)
+        if self._use_streaming():
+            return self._online_stats()['std']
+        return self._derived('std', lambda: self.array[1:].std(axis=1), readonly=True)
 
     @property
     def min(self):
         """Minimum of the data columns."""
-        return self.array[1:].min(axis=1)
+        if self._use_streaming():
+            return self._online_stats()['min']
+        return self._derived('min', lambda: self.array[1:].min(axis=1), readonly=True)
 
     @property
     def max(self):
         """Maximum of the data columns."""
-        return self.array[1:].max(axis=1)
+        if self._use_streaming():
+            return self._online_stats()['max']
+        return self._derived('max', lambda: self.array[1:].max(axis=1), readonly=True)
+
+    def _derived(self, key, func, readonly=False):
+        """Return the cached result of *func()*, computing it on first use.
 
-    def _tcorrel(self, nstep=100, **kwargs):
+        Results are discarded by :meth:`XVG.clear_cache`. With
+        *readonly* = ``True`` the returned array cannot be modified (so
+        that the cached value cannot be changed by accident).
+        """
+        try:
+            return self.__derived[key]
+        except KeyError:
+            pass
+        value = func()
+        if readonly and isinstance(value, numpy.ndarray):
+            value.flags.writeable = False
+        self.__derived[key] = value
+        return value
+
+    def clear_cache(self):
+        """Discard all results that were computed from the data.
+
+        This happens automatically when the data are replaced with
+        :meth:`XVG.set`, :meth:`XVG.parse` or :meth:`XVG.read` (or
+        extended by :meth:`XVG.refresh`). Call it after modifying
+        :attr:`XVG.array` in place.
+        """
+        self.__cache.clear()
+        self.__derived.clear()
+
+    def _use_streaming(self):
+        """``True`` if statistics should be computed without loading the data."""
+        return self.streaming and self.__array is None
+
+    def _online_stats(self):
+        """Compute mean, std, min, and max of all data columns in one pass.
+
+        The file is processed in chunks (see :meth:`XVG.iterchunks`);
+        the statistics of each chunk are combined with the running
+        values with the pairwise update of Chan et al. (a numerically
+        stable generalization of Welford's algorithm), so that the data
+        never have to be held in memory as a whole. The results are cached.
+
+        :Returns: dictionary with arrays *mean*, *std*, *min*, *max*
+                  (one value per data column) and *n*, the number of rows
+        """
+        if 'stats' in self.__cache:
+            return self.__cache['stats']
+        n = 0
+        mean = M2 = vmin = vmax = None
+        for chunk in self.iterchunks():
+            y = chunk[1:]
+            nb = y.shape[-1]
+            mean_b = y.mean(axis=1)
+            M2_b = ((y - mean_b[:, numpy.newaxis])**2).sum(axis=1)
+            if mean is None:
+                mean, M2 = mean_b, M2_b
+                vmin, vmax = y.min(axis=1), y.max(axis=1)
+            else:
+                delta = mean_b - mean
+                ntot = n + nb
+                mean = mean + delta * (float(nb) / ntot)
+                M2 = M2 + M2_b + delta**2 * (float(n) * nb / ntot)
+                vmin = numpy.minimum(vmin, y.min(axis=1))
+                vmax = numpy.maximum(vmax, y.max(axis=1))
+            n += nb
+        if mean is None:
+            raise MissingDataError("{0!s}: no data to compute statistics".format(self.real_filename))
+        self.__cache['stats'] = {'n': n, 'mean': mean, 'std': numpy.sqrt(M2/n),
+                                 'min': vmin, 'max': vmax}
+        return self.__cache['stats']
+
+    def _acf(self, nstep=100, columns=None):
+        """Autocorrelation functions of the data columns.
+
+        Every *nstep* data point of the *columns* (default: all data
+        columns) is used. The ACFs of all columns are calculated
+        together with :func:`autocorrelation_fft` and cached for each
+        combination of *nstep* and *columns*.
+
+        :Returns: ``(t, acf)`` with the times *t* of the data points and
+                  the array *acf* with one ACF for each column
+        """
+        if columns is None:
+            columns = range(1, self.array.shape[0])
+        key = (nstep, tuple(columns))
+        acfs = self.__cache.setdefault('acf', {})
+        if key not in acfs:
+            t = self.array[0, ::nstep]
+            acfs[key] = t, autocorrelation_fft(self.array[list(columns), ::nstep])
+        return acfs[key]
+
+    def _tcorrel(self, nstep=100, columns=None, debug=False):
         """Correlation "time" of data.
 
         The 0-th column of the data is interpreted as a time and the
         decay of the data is computed from the autocorrelation
-        function (using FFT).
+        function (using FFT). The results are the same as for
+        :func:`numkit.timeseries.tcorrel` applied to each column but
+        the ACFs of all columns are computed together (see
+        :meth:`XVG._acf`).
 
         .. SeeAlso:: :func:`numkit.timeseries.tcorrel`
         """
-        t = self.array[0,::nstep]
-        r = gromacs.collections.Collection([numkit.timeseries.tcorrel(t, Y, nstep=1, **kwargs) for Y in self.array[1:,::nstep]])
-        return r
+        t, acfs = self._acf(nstep=nstep, columns=columns)
+        if len(t) < 500:  # 500 is a bit arbitrary (same as numkit)
+            wmsg = "tcorrel(): Only %d datapoints for the chosen nstep=%d; " \
+                "ACF will possibly not be accurate." % (len(t), nstep)
+            warnings.warn(wmsg, category=LowAccuracyWarning)
+            self.logger.warning(wmsg)
+        simpson = _simpson()
+        results = []
+        for acf in acfs:
+            try:
+                i0 = numpy.where(acf <= 0)[0][0]  # first root of acf
+            except IndexError:
+                i0 = -1   # use last value as best estimate
+            norm = acf[0] or 1.0  # guard against a zero ACF
+            tc = simpson(acf[:i0]/norm, x=t[:i0])
+            # error estimate for the mean [Frenkel & Smit, p526]
+            sigma = numpy.sqrt(2*tc*acf[0]/(t[-1] - t[0]))
+            result = {'tc': tc, 't0': t[i0], 'sigma': sigma}
+            if debug:
+                result['t'] = t[:i0]
+                result['acf'] = acf[:i0]
+            results.append(result)
+        return gromacs.collections.Collection(results)
 
     def set_correlparameters(self, **kwargs):
         """Set and change the parameters for calculations with  correlation functions.
@@ -410,6 +867,8 @@ class XVG(utilities.FileUtils):
            *ncorrel*
                If no *nstep* is supplied, aim at using *ncorrel* data points for
                the FFT; sets :attr:`XVG.ncorrel` [25000]
+           *columns*
+               data columns to be analyzed (default: all data columns)
            *force*
                force recalculating correlation data even if cached values are
                available
@@ -419,20 +878,31 @@ class XVG(utilities.FileUtils):
         .. SeeAlso: :attr:`XVG.error` for details and references.
         """
         self.ncorrel = kwargs.pop('ncorrel', self.ncorrel) or 25000
-        nstep = kwargs.pop('nstep', None)
+        if 'nstep' in kwargs:
+            # explicitly chosen nstep persists (None restores the default)
+            self.__nstep = kwargs.pop('nstep')
+        nstep = self.__nstep
         if nstep is None:
             # good step size leads to ~25,000 data points
             nstep = len(self.array[0])/float(self.ncorrel)
             nstep = int(numpy.ceil(nstep))  # catch small data sets
         kwargs['nstep'] = nstep
+        if kwargs.get('columns', None) is not None:
+            kwargs['columns'] = tuple(kwargs['columns'])  # used as cache key
         self.__correlkwargs.update(kwargs)  # only contains legal kw for numkit.timeseries.tcorrel or force
         return self.__correlkwargs
 
     def _correlprop(self, key, **kwargs):
         kwargs = self.set_correlparameters(**kwargs)
-        if not self.__cache.get('tcorrel', None) or kwargs.pop('force', False):
-            self.__cache['tcorrel'] = self._tcorrel(**kwargs)
-        return numpy.array(self.__cache['tcorrel'].get(key).tolist())
+        force = kwargs.pop('force', False)
+        if force:
+            self.__cache.pop('acf', None)
+        # results are cached separately for each set of parameters
+        results = self.__cache.setdefault('correl', {})
+        params = tuple(sorted(kwargs.items()))
+        if force or params not in results:
+            results[params] = self._tcorrel(**kwargs)
+        return numpy.array(results[params].get(key).tolist())
 
     @property
     def error(self):
@@ -462,75 +932,1434 @@ class XVG(utilities.FileUtils):
         """
         return self._correlprop('tc')
 
+    def block_average(self):
+        """Block averaging analysis of the error of the mean of all data columns.
+
+        Implements the blocking method of [FlyvbjergPetersen1989]_: the
+        data are repeatedly transformed into half as many blocks by
+        averaging neighbouring pairs (a last unpaired point is dropped).
+        For uncorrelated blocks the variance of the block averages
+        divided by the number of blocks minus one estimates the
+        variance of the mean. This estimate grows with the block size
+        until the blocks are longer than the correlation time and then
+        stays constant (the plateau).
+
+        All columns are transformed at once; as every level halves the
+        data the total cost is O(N). The result is cached.
+
+        .. [FlyvbjergPetersen1989] H. Flyvbjerg and H. G. Petersen,
+                                   Error estimates on averages of
+                                   correlated data. J Chem Phys 91 (1989),
+                                   461--466. doi:10.1063/1.457480
+
+        :Returns: tuple ``(blocksize, error, error_error)`` with the
+                  number of data points per block for every level
+                  (array of shape ``(nlevels,)``), the estimated standard
+                  error of the mean and its uncertainty (arrays of shape
+                  ``(nlevels, ncolumns)``)
+        :Raises: :exc:`MissingDataError` with fewer than two data points
+
+        .. SeeAlso:: :attr:`XVG.error_blocking` for the plateau estimate
+        """
+        if 'blocking' in self.__cache:
+            return self.__cache['blocking']
+        if self.array.ndim < 2 or self.array.shape[-1] < 2:
+            raise MissingDataError("block_average() needs at least two data points")
+        x = numpy.array(self.array[1:], dtype=float)   # contiguous copy
+        blocksize, variances = [], []
+        size = 1
+        while x.shape[1] >= 2:
+            n = x.shape[1]
+            blocksize.append(size)
+            variances.append(x.var(axis=1) / (n - 1))
+            m = n // 2
+            x = 0.5 * (x[:, 0:2*m:2] + x[:, 1:2*m:2])
+            size *= 2
+        blocksize = numpy.array(blocksize)
+        error = numpy.sqrt(numpy.array(variances)).reshape(len(blocksize), -1)
+        nblocks = self.array.shape[-1] // blocksize
+        error_error = error / numpy.sqrt(2 * (nblocks - 1))[:, numpy.newaxis]
+        self.__cache['blocking'] = blocksize, error, error_error
+        return self.__cache['blocking']
+
+    @property
+    def error_blocking(self):
+        """Error on the mean of the data from block averaging.
+
+        For each column the estimate of the first level of
+        :meth:`XVG.block_average` at which the error does not increase
+        by more than its uncertainty at the next level is taken (the
+        start of the plateau). If no plateau is found the estimate of
+        the last level with at least 16 blocks (or the last level) is
+        used and a :exc:`LowAccuracyWarning` is issued.
+        """
+        blocksize, error, error_error = self.block_average()
+        nblocks = self.array.shape[-1] // blocksize
+        plateau = error[1:] - error[:-1] <= error_error[:-1]
+        found = plateau.any(axis=0)
+        level = numpy.where(found, numpy.argmax(plateau, axis=0),
+                            max(numpy.sum(nblocks >= 16) - 1, 0))
+        if not numpy.all(found):
+            warnings.warn("{0!s}: no plateau in the block averaging error for columns {1!r}; "
+                          "the error is probably underestimated (more data are needed).".format(
+                              getattr(self, 'real_filename', 'array'),
+                              list(numpy.flatnonzero(~found) + 1)),
+                          category=LowAccuracyWarning)
+        return error[level, numpy.arange(error.shape[1])]
+
+    def resample(self, dt=None, new_time=None, method="linear"):
+        """Interpolate all data columns onto a new time grid.
+
+        Either the spacing *dt* of a regular grid (starting at the first
+        time of the data) or the array *new_time* with the new times must
+        be given. The position of every new time in the old time axis
+        is only looked up once and then used for all columns.
+
+        :Keywords:
+           *dt*
+               time step of the new, regular grid
+           *new_time*
+               array with the new times (increasing)
+           *method*
+               "linear" interpolation, "nearest" neighbour, or "mean" for
+               the average of all data points in the bin around each new
+               time (the bins are bounded by the midpoints between new
+               times), which is appropriate for downsampling ["linear"]
+
+        The time (first column) of the data must be non-decreasing. New
+        times outside the data and empty bins (for "mean") are NaN.
+
+        :Returns: new :class:`XVG` instance with the resampled data (the
+                  data of this instance are not changed or copied)
+        """
+        a = self.array
+        t, y = a[0], a[1:]
+        if numpy.any(t[1:] < t[:-1]):
+            raise ValueError("Time must be non-decreasing; use XVG.merge() for restarted runs.")
+        if new_time is None:
+            if dt is None:
+                raise ValueError("Either dt or new_time must be provided.")
+            n = int(numpy.floor((t[-1] - t[0]) / dt * (1 + 1e-12))) + 1
+            new_time = t[0] + dt * numpy.arange(n)
+        new_time = numpy.asarray(new_time, dtype=float)
+        inside = (new_time >= t[0]) & (new_time <= t[-1])
+        if method == "linear":
+            i = numpy.clip(numpy.searchsorted(t, new_time, side='right'), 1, len(t) - 1)
+            t0, t1 = t[i - 1], t[i]
+            dtime = t1 - t0
+            w = numpy.divide(new_time - t0, dtime, out=numpy.zeros_like(new_time), where=dtime > 0)
+            ynew = y[:, i - 1] * (1 - w) + y[:, i] * w
+        elif method == "nearest":
+            i = numpy.clip(numpy.searchsorted(t, new_time, side='left'), 1, len(t) - 1)
+            i -= (new_time - t[i - 1]) <= (t[i] - new_time)
+            ynew = y[:, i]
+        elif method == "mean":
+            half = 0.5 * numpy.diff(new_time)
+            if len(half) > 0:
+                edges = numpy.r_[new_time[0] - half[0], new_time[:-1] + half, new_time[-1] + half[-1]]
+            else:
+                edges = numpy.array([-numpy.inf, numpy.inf])
+            bounds = numpy.r_[numpy.searchsorted(t, edges[:-1], side='left'),
+                              numpy.searchsorted(t, edges[-1], side='right')]
+            with numpy.errstate(invalid='ignore'):
+                ynew = _binned_mean(y[:, bounds[0]:bounds[-1]], bounds - bounds[0])
+            inside = numpy.diff(bounds) > 0
+        else:
+            raise ValueError("method must be one of 'linear', 'nearest', 'mean', not {0!r}".format(method))
+        ynew = numpy.asarray(ynew, dtype=float)
+        ynew[:, ~inside] = numpy.nan
+        resampled = self.__class__(array=numpy.vstack([new_time, ynew]), names=self.names)
+        for attr in 'xaxis', 'yaxis':
+            if hasattr(self, attr):
+                setattr(resampled, attr, getattr(self, attr))
+        return resampled
+
+    def rolling(self, window, stat="mean", nrows=None):
+        """Statistic *stat* of all data columns in a moving window.
+
+        All columns are processed together and the cost is O(N),
+        independent of the *window* size: "mean", "var" and "std" are
+        computed from cumulative sums, "min" and "max" with the van
+        Herk/Gil-Werman algorithm (running extrema in blocks of
+        *window* samples). The variance is the population variance as
+        for :attr:`XVG.std`. A window that contains NaN or inf values
+        has the same value as the corresponding numpy reduction.
+
+        With *streaming* = ``True`` the file is read chunk by chunk (see
+        :meth:`XVG.iterrolling`) so that the original data are never
+        loaded completely.
+
+        :Arguments:
+           *window*
+               number of samples (rows) in the window
+           *stat*
+               "mean", "var", "std", "min" or "max" ["mean"]
+           *nrows*
+               number of rows per chunk [:attr:`XVG.parse_blocksize`]
+
+        :Returns: new :class:`XVG` instance with N - *window* + 1 rows;
+                  the time of each row is the time of the last sample in
+                  the window
+        """
+        chunks = list(self.iterrolling(window, stat=stat, nrows=nrows))
+        if chunks:
+            a = numpy.concatenate(chunks, axis=1)
+        else:
+            a = numpy.empty((self._ncolumns(), 0))
+        rolled = self.__class__(array=a, names=self.names)
+        for attr in 'xaxis', 'yaxis':
+            if hasattr(self, attr):
+                setattr(rolled, attr, getattr(self, attr))
+        return rolled
+
+    def iterrolling(self, window, stat="mean", nrows=None):
+        """Iterate over the moving window statistic *stat* in chunks.
+
+        Streaming version of :meth:`XVG.rolling`: the last *window* - 1
+        rows of each chunk of data (see :meth:`XVG.iterchunks`) are
+        carried over to the next chunk so that the windows across the
+        chunk boundaries are included.
+
+        :Returns: generator of arrays of shape ``(ncolumns, n)`` with
+                  the time of the last sample of each window in the
+                  first row
+        """
+        window = int(window)
+        if window < 1:
+            raise ValueError("window must be >= 1, not {0!r}".format(window))
+        try:
+            func = _rolling_stats[stat]
+        except KeyError:
+            raise ValueError("stat must be one of {0!r}, not {1!r}".format(
+                sorted(_rolling_stats), stat))
+        tail = None
+        for chunk in self._iterdata(nrows=nrows):
+            if tail is not None:
+                chunk = numpy.concatenate([tail, chunk], axis=1)
+            n = chunk.shape[1] - window + 1
+            if n > 0:
+                out = numpy.empty((chunk.shape[0], n))
+                out[0] = chunk[0, window - 1:]
+                out[1:] = func(chunk[1:], window)
+                yield out
+            # copy because iterchunks() reuses its buffer
+            tail = numpy.array(chunk[:, max(n, 0):])
+
+    def histogram(self, columns=None, bins=100, weights=None, range=None, periodic=None,
+                  density=False):
+        """Histograms of data columns.
+
+        All columns are binned together: the bin index of every value is
+        computed with array arithmetic and the counts of all columns are
+        accumulated with a single :func:`numpy.bincount`. With
+        *streaming* = ``True`` (and data that were not loaded yet) the
+        file is processed chunk by chunk (see :meth:`XVG.iterchunks`) and
+        only the counts are kept in memory.
+
+        :Keywords:
+           *columns*
+               indices of the columns; ``None`` uses all data columns [``None``]
+           *bins*
+               number of bins or an array with the bin edges (for all
+               columns) [100]
+           *weights*
+               weight of each row (data point), either an array of
+               length N or the index of the column that contains the
+               weights [``None``]
+           *range*
+               ``(low, high)`` for all columns or a list of such tuples,
+               one for each column; ``None`` uses the minimum and maximum
+               of each column (which requires an additional pass over the
+               data when streaming) [``None``]
+           *periodic*
+               ``(low, high)`` of the period of periodic coordinates such
+               as angles, e.g. ``(-180, 180)``; all values are wrapped into
+               the period, which is also used as the default *range*
+               [``None``]
+           *density*
+               ``True`` normalizes each histogram to a probability
+               density [``False``]
+
+        :Returns: tuple ``(counts, edges)`` with arrays of shape
+                  ``(ncolumns, nbins)`` and ``(ncolumns, nbins+1)``
+        """
+        if columns is None:
+            columns = numpy.arange(1, self._ncolumns())
+        columns = list(columns)
+        if range is None and periodic is not None:
+            range = periodic
+        edges = self._histogram_edges(columns, bins, range, periodic)
+        nbins = edges.shape[1] - 1
+        counts = numpy.zeros(len(columns) * nbins)
+        offset = 0
+        for chunk in self._iterdata():
+            n = chunk.shape[-1]
+            if weights is None:
+                w = None
+            elif numpy.isscalar(weights):
+                w = chunk[weights]
+            else:
+                w = numpy.asarray(weights)[offset:offset + n]
+            counts += _bincount_columns(chunk[columns], edges, w, periodic)
+            offset += n
+        counts = counts.reshape(len(columns), nbins)
+        if density:
+            total = counts.sum(axis=1)[:, numpy.newaxis]
+            counts = counts / numpy.where(total > 0, total, 1) / numpy.diff(edges, axis=1)
+        return counts, edges
+
+    def pmf(self, columns=None, bins=100, weights=None, range=None, periodic=None,
+            temperature=300.):
+        """Potentials of mean force (free energy profiles) of data columns.
+
+        The PMF F(x) = -kT ln P(x) is computed from the probability
+        density P(x) of each column (see :meth:`XVG.histogram` for the
+        keywords) in kJ/mol and shifted so that its minimum is 0. Empty
+        bins have F = inf.
+
+        :Keywords:
+           *temperature*
+               temperature in K [300]
+
+        :Returns: tuple ``(F, x)`` with arrays of shape
+                  ``(ncolumns, nbins)`` with the PMFs and the bin centres
+        """
+        P, edges = self.histogram(columns=columns, bins=bins, weights=weights, range=range,
+                                  periodic=periodic, density=True)
+        kT = 0.0083144621 * temperature     # kJ/mol
+        with numpy.errstate(divide='ignore'):
+            F = -kT * numpy.log(P)
+        finite = numpy.isfinite(F)
+        Fmin = numpy.where(finite, F, numpy.inf).min(axis=1)
+        F -= numpy.where(numpy.isfinite(Fmin), Fmin, 0)[:, numpy.newaxis]
+        return F, 0.5 * (edges[:, 1:] + edges[:, :-1])
+
+    def _ncolumns(self):
+        """Number of columns (reads the first chunk when streaming)."""
+        for chunk in self._iterdata():
+            return chunk.shape[0]
+        return 0
+
+    def _iterdata(self, nrows=None):
+        """Chunks of the data (see :meth:`XVG.iterchunks`); loads the data unless streaming."""
+        if not self._use_streaming():
+            self.array
+        return self.iterchunks(nrows=nrows)
+
+    def _histogram_edges(self, columns, bins, range, periodic):
+        """Bin edges (shape ``(ncolumns, nbins+1)``) for :meth:`XVG.histogram`."""
+        if not numpy.isscalar(bins):
+            return numpy.tile(numpy.asarray(bins, dtype=float), (len(columns), 1))
+        if range is None:
+            low = numpy.full(len(columns), numpy.inf)
+            high = numpy.full(len(columns), -numpy.inf)
+            for chunk in self._iterdata():
+                y = chunk[columns]
+                if y.shape[-1] == 0:
+                    continue
+                # fmin/fmax ignore NaN; infinite values are excluded separately
+                ylow, yhigh = numpy.fmin.reduce(y, axis=1), numpy.fmax.reduce(y, axis=1)
+                bad = numpy.isinf(ylow) | numpy.isinf(yhigh)
+                for i in numpy.flatnonzero(bad):
+                    finite = y[i][numpy.isfinite(y[i])]
+                    ylow[i], yhigh[i] = (finite.min(), finite.max()) if len(finite) else (numpy.nan, numpy.nan)
+                low = numpy.fmin(low, ylow)
+                high = numpy.fmax(high, yhigh)
+        else:
+            low, high = numpy.broadcast_to(numpy.asarray(range, dtype=float), (len(columns), 2)).T
+        low = numpy.array(low, dtype=float)
+        high = numpy.array(high, dtype=float)
+        empty = ~(high > low)
+        low[empty] -= 0.5
+        high[empty] += 0.5
+        return numpy.linspace(low, high, bins + 1, axis=1)
+
+    def detect_equilibration(self, columns=None, ncandidates=50, full=False):
+        """Find the start of the equilibrated part of each data column.
+
+        The method of [Chodera2016]_ chooses the origin t0 that
+        maximizes the number of uncorrelated samples (N - t0)/g(t0) in
+        the remaining data, where g is the statistical inefficiency
+        (see :func:`statistical_inefficiency`). The origins are taken
+        from a geometric grid of *ncandidates* points between the first
+        data point and the middle of the data; for each candidate g is
+        calculated for all columns with a single batched FFT.
+
+        .. Note:: The autocorrelation function of the data after t0 has
+                  to be computed for every candidate because the mean of
+                  the remaining data changes with t0; it cannot be
+                  derived from a single FFT of the whole series. The
+                  search therefore costs O(*ncandidates* N log N) (and
+                  not O(N log N)), which is why only a small number of
+                  candidate origins is tested.
+
+        :Keywords:
+           *columns*
+               indices of the data columns; ``None`` uses all data
+               columns [``None``]
+           *ncandidates*
+               number of candidate origins [50]
+           *full*
+               also return the statistical inefficiency and the number of
+               uncorrelated samples at the chosen origins [``False``]
+
+        :Returns: array with the start time of each column, or a tuple
+                  ``(t0, g, neff)`` if *full* = ``True``
+        """
+        if columns is None:
+            columns = range(1, self.array.shape[0])
+        y = self.array[list(columns)]
+        N = y.shape[-1]
+        origins = numpy.unique(numpy.concatenate(
+            [[0], numpy.geomspace(1, max(N // 2, 1), ncandidates).astype(int)]))
+        g = numpy.array([statistical_inefficiency(y[:, i0:]) for i0 in origins])
+        neff = (N - origins)[:, numpy.newaxis] / g
+        best = numpy.argmax(neff, axis=0)
+        icol = numpy.arange(y.shape[0])
+        t0 = self.array[0, origins[best]]
+        if full:
+            return t0, g[best, icol], neff[best, icol]
+        return t0
+
+    def bootstrap(self, stat='mean', nboot=1000, block_size=None, ci=0.95, seed=None, nprocs=1):
+        """Moving block bootstrap confidence intervals of a statistic of all data columns.
+
+        Each bootstrap sample is put together from randomly chosen
+        (overlapping) blocks of *block_size* consecutive data points
+        so that the correlations within a block are preserved. The same
+        resampling indices are used for all columns. The confidence
+        interval is taken from the percentiles of the *nboot* bootstrap
+        replicates of the statistic.
+
+        The replicates are computed in chunks that are distributed over
+        *nprocs* processes. Each chunk has its own random generator
+        (:class:`numpy.random.RandomState`) whose seed is drawn from a
+        generator seeded with *seed*, so the results for a given *seed*
+        do not depend on *nprocs*.
+
+        :Keywords:
+           *stat*
+               name of a numpy function such as ``'mean'``, ``'median'`` or
+               ``'std'``, or a function that reduces the last axis of an
+               array, e.g. ``lambda x: numpy.percentile(x, 90, axis=-1)``
+               ["mean"]
+           *nboot*
+               number of bootstrap samples [1000]
+           *block_size*
+               number of consecutive points in a block; ``None`` uses
+               N**(1/3) for N data points [``None``]
+           *ci*
+               confidence level [0.95]
+           *seed*
+               seed for the random number generator; ``None`` uses fresh
+               entropy from the operating system [``None``]
+           *nprocs*
+               number of processes [1]
+
+        :Returns: tuple ``(value, low, high)`` of arrays with the
+                  statistic of each column and the lower and upper
+                  bound of the confidence interval
+        """
+        global _bootstrap_args
+
+        if isinstance(stat, six.string_types):
+            stat = functools.partial(getattr(numpy, stat), axis=-1)
+        y = numpy.asarray(self.array[1:])
+        N = y.shape[-1]
+        if block_size is None:
+            block_size = max(int(round(N**(1./3))), 1)
+        block_size = min(block_size, N)
+        # fixed chunks of at most 100 replicates (and ~64 MiB of resampled data)
+        chunk = int(max(1, min(100, 2**23 // (y.shape[0] * N or 1))))
+        sizes = [min(chunk, nboot - i) for i in range(0, nboot, chunk)]
+        seeds = numpy.random.RandomState(seed).randint(2**31 - 1, size=len(sizes))
+        tasks = [(chunkseed, n, block_size) for chunkseed, n in zip(seeds, sizes)]
+        ctx = _fork_context()
+        if ctx is None:
+            nprocs = 1
+        _bootstrap_args = y, stat
+        try:
+            if nprocs > 1 and len(tasks) > 1:
+                with _process_pool(min(nprocs, len(tasks)), ctx) as pool:
+                    replicates = pool.map(_bootstrap_chunk, tasks)
+            else:
+                replicates = [_bootstrap_chunk(task) for task in tasks]
+        finally:
+            _bootstrap_args = None
+        replicates = numpy.concatenate(replicates, axis=1)
+        low, high = numpy.percentile(replicates, [50. * (1 - ci), 50. * (1 + ci)], axis=1)
+        return stat(y), low, high
+
     def parse(self, stride=None):
         """Read and cache the file as a numpy array.
 
         Store every *stride* line of data; if ``None`` then the class default is used.
+        Lines that are not stored are neither converted nor checked (i.e.
+        corrupted data in those lines go unnoticed) but they are counted
+        as data lines.
 
         The array is returned with column-first indexing, i.e. for a data file with
         columns X Y1 Y2 Y3 ... the array a will be a[0] = X, a[1] = Y1, ... .
+
+        The file is processed in blocks of :attr:`XVG.parse_blocksize`
+        lines (see :meth:`XVG._iterblocks`): blocks of plain numerical
+        data are converted in bulk and only blocks that contain header
+        lines or corrupted data are parsed line by line. The converted
+        rows are copied directly into a column-first buffer (see
+        :class:`_ColumnBuffer`) that is sized from the file size, so that
+        the result is a C-contiguous array without a second copy of the
+        data.
+
+        With *nprocs* > 1 large uncompressed files are parsed in parallel
+        (see :meth:`XVG._parse_parallel`).
         """
         if stride is None:
             stride = self.stride
+        self.__tail = None
+        self.clear_cache()
+        if self.cache and self._read_cache(stride):
+            return
+        nnames = len(self.names)
         self.corrupted_lineno = []
-        irow  = 0  # count rows of data
-        # cannot use numpy.loadtxt() because xvg can have two types of 'comment' lines
-        with utilities.openany(self.real_filename) as xvg:
-            rows = []
-            ncol = None
-            for lineno,line in enumerate(xvg):
-                line = line.strip()
-                if len(line) == 0:
-                    continue
-                if "label" in line and "xaxis" in line:
-                        self.xaxis = line.split('"')[-2]
-                if "label" in line and "yaxis" in line:
-                        self.yaxis = line.split('"')[-2]
-                if line.startswith("@ legend"):
-                                        if not "legend" in self.metadata: self.metadata["legend"] = []
-                                        self.metadata["legend"].append(line.split("legend ")[-1])
-                if line.startswith("@ s") and "subtitle" not in line:
-                                        name = line.split("legend ")[-1].replace('"','').strip()
-                                        self.names.append(name)
-                if line.startswith(('#', '@')) :
-                                        continue
-                if line.startswith('&'):
-                    raise NotImplementedError('{0!s}: Multi-data not supported, only simple NXY format.'.format(self.real_filename))
-                # parse line as floats
-                try:
-                    row = list(map(float, line.split()))
-                except:
-                    if self.permissive:
-                        self.logger.warn("%s: SKIPPING unparsable line %d: %r",
-                                         self.real_filename, lineno+1, line)
-                        self.corrupted_lineno.append(lineno+1)
-                        continue
-                    self.logger.error("%s: Cannot parse line %d: %r",
-                                      self.real_filename, lineno+1, line)
-                    raise
-                # check for same number of columns as in previous step
-                if ncol is not None and len(row) != ncol:
-                    if self.permissive:
-                        self.logger.warn("%s: SKIPPING line %d with wrong number of columns: %r",
-                                         self.real_filename, lineno+1, line)
-                        self.corrupted_lineno.append(lineno+1)
-                        continue
-                    errmsg = "{0!s}: Wrong number of columns in line {1:d}: {2!r}".format(self.real_filename, lineno+1, line)
-                    self.logger.error(errmsg)
-                    raise IOError(errno.ENODATA, errmsg, self.real_filename)
-                # finally: a good line
-                if irow % stride == 0:
-                    ncol = len(row)
-                    rows.append(row)
-                irow += 1
+        if self._parallel_ok():
+            self.__array = self._parse_parallel(stride)
+            self.__headerparsed = True
+            if self.cache:
+                self._write_cache(stride, names=self.names[nnames:])
+            return
+        buf = None
         try:
-            self.__array = numpy.array(rows).transpose()    # cache result
+            with utilities.openany(self.real_filename) as xvg:
+                for rows, ndata in self._iterblocks(xvg, header=not self.__headerparsed,
+                                                    stride=stride):
+                    if len(rows) > 0:
+                        if buf is None:
+                            capacity = self._estimate_nrows(stride) or self.parse_blocksize
+                            buf = _ColumnBuffer(rows.shape[1], capacity=capacity,
+                                                dtype=self.dtype, inplace=True)
+                        buf.append(rows)
+            self.__headerparsed = True
+            if buf is not None:
+                self.__array = buf.trim()    # cache result
+            else:
+                self.__array = numpy.array([])
         except:
             self.logger.error("%s: Failed reading XVG file, possibly data corrupted. "
                               "Check the last line of the file...", self.real_filename)
             raise
         finally:
-            del rows     # try to clean up as well as possible as it can be massively big
+            del buf     # try to clean up as well as possible as it can be massively big
+        if self.cache:
+            self._write_cache(stride, names=self.names[nnames:])
+
+    def _estimate_nrows(self, stride=1):
+        """Estimate the number of data rows from the size of an uncompressed file.
+
+        The estimate errs on the high side: the data are parsed into a
+        buffer of this size (see :class:`_ColumnBuffer`) and memory that
+        is never written to does not count. Returns ``None`` for
+        compressed files.
+        """
+        if os.path.splitext(self.real_filename)[1] in ('.gz', '.bz2', '.xz'):
+            return None
+        try:
+            with open(self.real_filename, 'rb') as xvg:
+                xvg.seek(0, os.SEEK_END)
+                size = xvg.tell()
+                xvg.seek(max(size - 2**16, 0))    # data lines at the end of the file
+                sample = xvg.read()
+        except (IOError, OSError):
+            return None
+        nlines = sample.count(b'\n')
+        if nlines == 0:
+            return None
+        return int(1.1 * size * nlines / len(sample)) // stride + 1
+
+    def _parallel_ok(self):
+        """Check if the file can be parsed in parallel by :meth:`XVG._parse_parallel`."""
+        if self.nprocs is None or self.nprocs < 2:
+            return False
+        if os.path.splitext(self.real_filename)[1] in ('.gz', '.bz2', '.xz'):
+            self.logger.debug("%s: compressed files are parsed serially", self.real_filename)
+            return False
+        if _fork_context() is None:
+            self.logger.debug("%s: parallel parsing requires the 'fork' start method",
+                              self.real_filename)
+            return False
+        return os.path.getsize(self.real_filename) >= self.parallel_minsize
+
+    def _parse_parallel(self, stride=1):
+        """Parse the file with :attr:`XVG.nprocs` worker processes.
+
+        The header is read serially up to the first data line. The
+        remaining file is split into :attr:`XVG.nprocs` byte ranges that
+        start and end at line boundaries. In a first pass the workers
+        count the lines and data lines in each range so that the line
+        number and the position in the output of the first row of every
+        range are known. The output array of shape ``(ncol, nrows)`` is
+        then allocated in (anonymous) shared memory and in a second pass
+        each worker converts its range (with :meth:`XVG._iterblocks`)
+        directly into its slice of the output.
+
+        The result is identical to the serial parser: rows are in file
+        order, *stride* counts data lines across the whole file and with
+        :attr:`XVG.permissive` the line numbers of skipped lines are
+        collected in :attr:`XVG.corrupted_lineno` in ascending order
+        (otherwise the first error in the file is raised). Only the
+        header at the top of the file is used for the metadata; header
+        lines further down are skipped.
+        """
+        global _parallel_output, _parallel_xvg
+
+        ctx = _fork_context()
+        lineno = 0
+        start = 0
+        ncol = None
+        with open(self.real_filename, 'rb') as xvg:
+            for line in iter(xvg.readline, b''):
+                s = line.strip()
+                if s and not s.startswith((b'#', b'@')):
+                    break
+                if s and not self.__headerparsed:
+                    self._parse_header(s.decode('utf-8', 'replace'))
+                start += len(line)
+                lineno += 1
+            # number of columns from the first good data line
+            while line:
+                try:
+                    ncol = len(self._convert(line)) or None
+                except (ValueError, IndexError):
+                    ncol = None
+                if ncol is not None:
+                    break
+                line = xvg.readline()
+            xvg.seek(0, os.SEEK_END)
+            size = xvg.tell()
+            # byte ranges aligned to line boundaries
+            bounds = [start]
+            for i in range(1, self.nprocs):
+                xvg.seek(max(start + (size - start) * i // self.nprocs, bounds[-1]))
+                xvg.readline()
+                offset = min(xvg.tell(), size)
+                if offset > bounds[-1]:
+                    bounds.append(offset)
+            if bounds[-1] < size:
+                bounds.append(size)
+        ranges = list(zip(bounds[:-1], bounds[1:]))
+        if not ranges or ncol is None:
+            # no good data at all: the serial parser gives the canonical result
+            return self._parse_parallel_fallback(start, lineno, stride)
+        self.logger.debug("%s: parsing %d byte ranges with %d processes",
+                          self.real_filename, len(ranges), self.nprocs)
+
+        _parallel_xvg = self
+        try:
+            with _process_pool(min(self.nprocs, len(ranges)), ctx) as pool:
+                counts = pool.map(_parallel_task, [('_count_range', r) for r in ranges])
+        finally:
+            _parallel_xvg = None
+        counts = _parallel_results(counts)
+
+        # line number, data line number and output offset of each range
+        tasks = []
+        irow = nrows = 0
+        for (first, last), (nlines, ndata) in zip(ranges, counts):
+            nkept = -(-(irow + ndata) // stride) - (-(-irow // stride))
+            tasks.append((first, last, lineno, irow, ncol, nrows, nkept, stride))
+            lineno += nlines
+            irow += ndata
+            nrows += nkept
+
+        buf = mmap.mmap(-1, max(ncol * nrows * numpy.dtype(self.dtype).itemsize, 1))
+        out = numpy.frombuffer(buf, dtype=self.dtype, count=ncol * nrows).reshape(ncol, nrows)
+        _parallel_output, _parallel_xvg = out, self
+        try:
+            with _process_pool(min(self.nprocs, len(tasks)), ctx) as pool:
+                results = pool.map(_parallel_task, [('_parse_range', t) for t in tasks])
+        finally:
+            _parallel_output = _parallel_xvg = None
+        results = _parallel_results(results)    # first error in the file wins
+
+        # close the gaps left by skipped (corrupted) lines
+        n = 0
+        for task, (nfilled, corrupted) in zip(tasks, results):
+            offset = task[5]
+            if n != offset and nfilled > 0:
+                out[:, n:n + nfilled] = out[:, offset:offset + nfilled]
+            n += nfilled
+            self.corrupted_lineno.extend(corrupted)
+        return out[:, :n] if n < nrows else out
+
+    def _parse_parallel_fallback(self, start, lineno, stride):
+        """Parse the data section starting at byte *start* serially."""
+        buf = None
+        with open(self.real_filename, 'rb') as xvg:
+            xvg.seek(start)
+            stream = io.TextIOWrapper(xvg)
+            for rows, ndata in self._iterblocks(stream, header=False, lineno=lineno,
+                                                stride=stride):
+                if len(rows) > 0:
+                    if buf is None:
+                        buf = _ColumnBuffer(rows.shape[1], capacity=self.parse_blocksize,
+                                            dtype=self.dtype, inplace=True)
+                    buf.append(rows)
+        if buf is not None:
+            return buf.trim()
+        return numpy.array([])
+
+    def _count_range(self, byterange):
+        """Count all lines and the data lines in the byte range ``(start, end)``.
+
+        :Returns: tuple ``(nlines, ndata)``
+        """
+        nlines = ndata = 0
+        for text in _read_range(self.real_filename, *byterange):
+            n = text.count('\n') + (not text.endswith('\n'))
+            nlines += n
+            if ('#' in text or '@' in text or '&' in text or
+                    _BLANK_LINE.search(text) or not text[:text.find('\n')].strip()):
+                n = 0
+                for line in text.split('\n'):
+                    line = line.lstrip()
+                    if line and line[0] not in '#@':
+                        n += 1
+            ndata += n
+        return nlines, ndata
+
+    def _parse_range(self, task):
+        """Parse one byte range into the shared output array (worker process).
+
+        *task* is a tuple ``(start, end, lineno, irow, ncol, offset,
+        nrows, stride)`` as set up by :meth:`XVG._parse_parallel`; the
+        rows are written to columns *offset* ... *offset* + *nrows* of
+        the shared output.
+
+        :Returns: tuple ``(nfilled, corrupted_lineno)`` with the number
+                  of rows that were written (fewer than *nrows* if
+                  corrupted lines were skipped) and the line numbers of
+                  skipped lines
+        """
+        start, end, lineno, irow, ncol, offset, nrows, stride = task
+        out = _parallel_output
+        self.corrupted_lineno = []
+        stream = itertools.chain.from_iterable(
+            io.StringIO(text) for text in _read_range(self.real_filename, start, end))
+        n = 0
+        for rows, ndata in self._iterblocks(stream, header=False, lineno=lineno, ncol=ncol,
+                                            stride=stride, irow=irow):
+            if len(rows) > 0:
+                out[:, offset + n:offset + n + len(rows)] = rows.T
+                n += len(rows)
+        return n, self.corrupted_lineno
+
+    def _cache_filenames(self):
+        """Return the filenames of the array cache and its metadata.
+
+        With *cache* = ``True`` the files are placed next to the xvg
+        file. If *cache* is a directory then the path of the xvg file is
+        hashed into the filename so that files with the same name in
+        different directories do not clash.
+        """
+        if self.cache is True:
+            npy = self.real_filename + os.extsep + "npy"
+        else:
+            dirname = utilities.realpath(self.cache)
+            tag = hashlib.sha1(self.real_filename.encode('utf-8')).hexdigest()[:12]
+            basename = os.path.basename(self.real_filename)
+            npy = os.path.join(dirname, "{0}.{1}.npy".format(basename, tag))
+        return npy, npy + os.extsep + "json"
+
+    def _cache_key(self, stride):
+        """Properties of the xvg file that must not change for a valid cache."""
+        st = os.stat(self.real_filename)
+        return {'source': self.real_filename, 'mtime': st.st_mtime,
+                'size': st.st_size, 'stride': stride,
+                'permissive': bool(self.permissive),
+                'dtype': numpy.dtype(self.dtype).str,
+                'usecols': list(self.usecols) if self.usecols is not None else None}
+
+    def _read_cache(self, stride):
+        """Memory-map the cached array if it is still valid.
+
+        :Returns: ``True`` if the cache was used, ``False`` otherwise
+        """
+        npy, meta = self._cache_filenames()
+        try:
+            with open(meta) as f:
+                header = json.load(f)
+            if header['key'] != self._cache_key(stride):
+                self.logger.debug("%s: cache %r is out of date", self.real_filename, npy)
+                return False
+            a = numpy.load(npy, mmap_mode='r')
+            if list(a.shape) != header['shape']:
+                return False   # replaced concurrently
+        except (IOError, OSError, ValueError, KeyError):
+            return False
+        self.__array = a
+        self.names.extend(header['names'])
+        if 'legend' in header:
+            self.metadata.setdefault('legend', []).extend(header['legend'])
+        for attr in 'xaxis', 'yaxis':
+            if attr in header:
+                setattr(self, attr, header[attr])
+        self.corrupted_lineno = header['corrupted_lineno']
+        self.__headerparsed = True
+        self.logger.debug("%s: loaded data from cache %r", self.real_filename, npy)
+        return True
+
+    def _write_cache(self, stride, names):
+        """Store the parsed array and the metadata from the header in the cache.
+
+        Failure to write the cache is logged but otherwise ignored.
+        """
+        npy, meta = self._cache_filenames()
+        header = {'key': self._cache_key(stride),
+                  'shape': list(self.__array.shape),
+                  'names': names,
+                  'corrupted_lineno': self.corrupted_lineno}
+        if 'legend' in self.metadata:
+            header['legend'] = self.metadata['legend']
+        for attr in 'xaxis', 'yaxis':
+            if hasattr(self, attr):
+                header[attr] = getattr(self, attr)
+        try:
+            utilities.mkdir_p(os.path.dirname(npy))
+            # write to temporary files first so that other processes
+            # never see incomplete cache files
+            tmp = "{0}.{1}.tmp".format(npy, os.getpid())
+            with open(tmp, 'wb') as f:
+                numpy.save(f, numpy.ascontiguousarray(self.__array))
+            os.rename(tmp, npy)
+            with open(tmp, 'w') as f:
+                json.dump(header, f)
+            os.rename(tmp, meta)
+        except (IOError, OSError) as err:
+            self.logger.warning("%s: failed to write cache %r: %s", self.real_filename, npy, err)
+            return
+        self.logger.debug("%s: wrote cache %r", self.real_filename, npy)
+
+    def save_npz(self, filename, compressed=False):
+        """Save the data, metadata and statistics in the NumPy file *filename*.
+
+        The ``.npz`` file (see :func:`numpy.savez`) contains the data as
+        array "array", the column names, axis labels, the name of the
+        xvg file and :attr:`XVG.metadata` (which must be JSON
+        serializable) as a JSON string "header", and the statistics
+        (:attr:`XVG.mean`, :attr:`XVG.std`, :attr:`XVG.min`,
+        :attr:`XVG.max`, :meth:`XVG.block_average`) that were already
+        computed. No objects are pickled. Read the file with
+        :meth:`XVG.load_npz`.
+
+        :Keywords:
+           *compressed*
+               ``True`` compresses the arrays with
+               :func:`numpy.savez_compressed` [``False``]
+        """
+        # collect the statistics first: parsing the file empties the caches
+        arrays = {}
+        stats = self.__cache.get('stats', {})
+        for key in self._statistics:
+            value = self.__derived.get(key, stats.get(key))
+            if value is not None:
+                arrays['stat_' + key] = value
+        if 'blocking' in self.__cache:
+            for name, value in zip(('blocksize', 'error', 'error_error'), self.__cache['blocking']):
+                arrays['blocking_' + name] = value
+        arrays['array'] = numpy.ascontiguousarray(self.array)
+        header = {'names': self.names, 'metadata': self.metadata}
+        if hasattr(self, 'real_filename'):
+            header['filename'] = self.real_filename
+        for attr in 'xaxis', 'yaxis':
+            if hasattr(self, attr):
+                header[attr] = getattr(self, attr)
+        arrays['header'] = numpy.array(json.dumps(header))
+        save = numpy.savez_compressed if compressed else numpy.savez
+        save(filename, **arrays)
+
+    @classmethod
+    def load_npz(cls, filename, **kwargs):
+        """Create an :class:`XVG` instance from a file written by :meth:`XVG.save_npz`.
+
+        The statistics in the file are used as cached values. Any
+        *kwargs* are used to create the instance.
+        """
+        with numpy.load(filename, allow_pickle=False) as npz:
+            header = json.loads(str(npz['header']))
+            xvg = cls(filename=header.get('filename'), array=npz['array'],
+                      names=header['names'], metadata=header['metadata'], **kwargs)
+            for attr in 'xaxis', 'yaxis':
+                if attr in header:
+                    setattr(xvg, attr, header[attr])
+            for key in cls._statistics:
+                if 'stat_' + key in npz.files:
+                    value = npz['stat_' + key]
+                    value.flags.writeable = False
+                    xvg.__derived[key] = value
+            if 'blocking_blocksize' in npz.files:
+                xvg.__cache['blocking'] = tuple(npz['blocking_' + name] for name in
+                                                ('blocksize', 'error', 'error_error'))
+        return xvg
+
+    def read_window(self, tmin=None, tmax=None):
+        """Read only the data with *tmin* <= t <= *tmax*.
+
+        The first column (t) must be non-decreasing. Instead of parsing
+        the whole file, the byte range that contains the window is
+        looked up in a sparse index (see :meth:`XVG.build_index`) and
+        only this part of the file is parsed. If the data were already
+        loaded then they are simply sliced.
+
+        *usecols* and *dtype* are honoured (*usecols* must contain 0);
+        *stride* is applied to the rows in the window. Header lines are
+        not processed, i.e. :attr:`XVG.names` is not set. Compressed
+        files are always parsed completely.
+
+        :Returns: array of shape ``(ncol, nrows)`` (a new array that is
+                  not stored in the instance)
+        """
+        if self.usecols is not None and 0 not in self.usecols:
+            raise ValueError("read_window() requires the first column (0) in usecols")
+        tmin = -numpy.inf if tmin is None else tmin
+        tmax = numpy.inf if tmax is None else tmax
+        if self.__array is not None:
+            a = self.__array
+            return a[:, (a[0] >= tmin) & (a[0] <= tmax)][:, ::self.stride]
+        if os.path.splitext(self.real_filename)[1] in ('.gz', '.bz2', '.xz'):
+            a = self.array
+            return a[:, (a[0] >= tmin) & (a[0] <= tmax)][:, ::self.stride]
+        times, offsets, linenos = self.build_index()
+        if numpy.any(times[1:] < times[:-1]):
+            raise ValueError("{0!s}: time is not monotonically increasing; "
+                             "cannot read a window".format(self.real_filename))
+        if len(times) == 0:
+            return numpy.array([])
+        i = max(numpy.searchsorted(times, tmin, side='left') - 1, 0)
+        j = numpy.searchsorted(times, tmax, side='right')
+        start = offsets[i]
+        end = offsets[j] if j < len(offsets) else os.path.getsize(self.real_filename)
+        self.logger.debug("%s: reading window [%g, %g] from bytes %d-%d",
+                          self.real_filename, tmin, tmax, start, end)
+        corrupted_lineno, self.corrupted_lineno = self.corrupted_lineno, []
+        try:
+            stream = itertools.chain.from_iterable(
+                io.StringIO(text) for text in _read_range(self.real_filename, start, end))
+            blocks = [rows for rows, ndata in self._iterblocks(stream, header=False,
+                                                               lineno=linenos[i])
+                      if len(rows) > 0]
+        finally:
+            self.corrupted_lineno = corrupted_lineno
+        if not blocks:
+            return numpy.array([])
+        a = numpy.concatenate(blocks).T
+        return a[:, (a[0] >= tmin) & (a[0] <= tmax)][:, ::self.stride]
+
+    def build_index(self):
+        """Return the sparse index that maps time to byte offsets in the file.
+
+        Every :attr:`XVG.index_interval` lines the byte offset and the
+        line number of the next data line and its time (first column)
+        are recorded. The index is built with a single scan over the
+        file (only the sampled lines are converted) and stored in a
+        ``.idx.npz`` file next to the xvg file (or in the *cache*
+        directory); it is rebuilt when the modification time or the size
+        of the xvg file changes.
+
+        :Returns: arrays ``(times, offsets, linenos)``
+        """
+        st = os.stat(self.real_filename)
+        key = numpy.array([st.st_mtime, st.st_size, self.index_interval], dtype=float)
+        if self.__index is not None and numpy.all(self.__index[0] == key):
+            return self.__index[1:]
+        filename = self._index_filename()
+        try:
+            with numpy.load(filename) as idx:
+                if numpy.all(idx['key'] == key):
+                    self.__index = (key, idx['times'], idx['offsets'], idx['linenos'])
+                    return self.__index[1:]
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+        # offsets of every index_interval'th line
+        candidates = [0]
+        nlines = 0
+        with open(self.real_filename, 'rb') as xvg:
+            pos = 0
+            while True:
+                chunk = xvg.read(self.refresh_readsize)
+                if not chunk:
+                    break
+                newlines = numpy.flatnonzero(numpy.frombuffer(chunk, dtype=numpy.uint8) == 10)
+                k = numpy.arange(nlines + 1, nlines + len(newlines) + 1)
+                candidates.extend((pos + newlines[k % self.index_interval == 0] + 1).tolist())
+                nlines += len(newlines)
+                pos += len(chunk)
+            # time and offset of the first data line at or after each candidate
+            times, offsets, linenos = [], [], []
+            for i, offset in enumerate(candidates):
+                xvg.seek(offset)
+                lineno = i * self.index_interval
+                for line in xvg:
+                    if not line.endswith(b'\n'):
+                        break   # incomplete last line
+                    s = line.strip()
+                    if s and not s.startswith((b'#', b'@', b'&')):
+                        try:
+                            t = float(s.split()[0])
+                        except ValueError:
+                            pass   # corrupted line
+                        else:
+                            if not offsets or offset > offsets[-1]:
+                                times.append(t)
+                                offsets.append(offset)
+                                linenos.append(lineno)
+                            break
+                    offset += len(line)
+                    lineno += 1
+        self.__index = (key, numpy.array(times, dtype=float),
+                        numpy.array(offsets, dtype=numpy.int64),
+                        numpy.array(linenos, dtype=numpy.int64))
+        try:
+            tmp = "{0}.{1}.tmp.npz".format(filename, os.getpid())
+            numpy.savez(tmp, key=key, times=self.__index[1], offsets=self.__index[2],
+                        linenos=self.__index[3])
+            os.rename(tmp, filename)
+        except (IOError, OSError) as err:
+            self.logger.warning("%s: failed to write index %r: %s", self.real_filename, filename, err)
+        return self.__index[1:]
+
+    def _index_filename(self):
+        """Filename of the index used by :meth:`XVG.read_window`."""
+        if self.cache:
+            base = os.path.splitext(self._cache_filenames()[0])[0]
+        else:
+            base = self.real_filename
+        return base + os.extsep + "idx" + os.extsep + "npz"
+
+    @classmethod
+    def peek(cls, filename, **kwargs):
+        """Read the metadata of the xvg file *filename* without parsing the data.
+
+        Only the header and the first data line are read; the last data
+        line is read from the end of the file. The number of rows is
+        estimated from the file size and the length of the last lines.
+        Data lines with a different number of columns than the first one
+        (e.g. an incomplete line of a running simulation) are ignored.
+        Compressed files cannot be read from the end: *t_last* and
+        *nrows* are ``None``.
+
+        Any *kwargs* are used to create the :class:`XVG` instance (e.g.
+        *usecols*).
+
+        :Returns: dictionary with the column *names*, the axis labels
+                  *xaxis* and *yaxis* (``None`` if not set), the number
+                  of columns *ncols*, the first and last time *t_first*
+                  and *t_last*, and the (estimated) number of rows
+                  *nrows*
+        """
+        xvg = cls(filename, **kwargs)
+        result = {'names': xvg.names, 'xaxis': None, 'yaxis': None, 'ncols': None,
+                  't_first': None, 't_last': None, 'nrows': None}
+        compressed = os.path.splitext(xvg.real_filename)[1] in ('.gz', '.bz2', '.xz')
+        first = None
+        # binary stream: tell() is the byte offset of the first data line
+        # (independent of the line endings)
+        opened = utilities.openany(xvg.real_filename) if compressed \
+            else open(xvg.real_filename, 'rb')
+        with opened as stream:
+            while True:
+                start = stream.tell()
+                line = stream.readline()
+                if not line:
+                    break
+                if isinstance(line, bytes):
+                    line = line.decode('utf-8', 'replace')
+                s = line.strip()
+                if s and not s.startswith(('#', '@', '&')):
+                    first = xvg._peek_convert(s)
+                    if first is not None:
+                        break
+                elif s.startswith(('#', '@')):
+                    xvg._parse_header(s)
+        for attr in 'xaxis', 'yaxis':
+            result[attr] = getattr(xvg, attr, None)
+        if first is None:
+            result['nrows'] = 0
+            return result
+        result['ncols'] = len(first)
+        result['t_first'] = first[0]
+        if compressed:
+            return result
+        with open(xvg.real_filename, 'rb') as stream:
+            stream.seek(0, os.SEEK_END)
+            size = stream.tell()
+            blocksize = 2**12
+            while True:
+                offset = max(size - blocksize, start)
+                stream.seek(offset)
+                tail = stream.read()
+                lines = tail.splitlines()[1 if offset > start else 0:]   # first line can be partial
+                last = None
+                for line in reversed(lines):
+                    s = line.decode('utf-8', 'replace').strip()
+                    if s and not s.startswith(('#', '@', '&')):
+                        last = xvg._peek_convert(s)
+                        if last is not None and len(last) == len(first):
+                            break
+                        last = None
+                if last is not None or offset == start:
+                    break
+                blocksize *= 16
+        result['t_last'] = first[0] if last is None else last[0]
+        # average length of the lines in the tail (excluding the partial first one)
+        nbytes = len(tail) - (len(tail.split(b'\n', 1)[0]) + 1 if offset > start else 0)
+        nlines = max(len(lines), 1)
+        result['nrows'] = int(round((size - start) * nlines / float(max(nbytes, 1))))
+        return result
+
+    def _peek_convert(self, line):
+        """Convert a data *line* for :meth:`XVG.peek` (``None`` if it is corrupted)."""
+        try:
+            return self._convert(line)
+        except (ValueError, IndexError):
+            return None
+
+    def refresh(self, final=False):
+        """Read the data that were appended to the file since the last call.
+
+        The first call reads all data in the file. The byte offset of
+        the last complete line is remembered and later calls only parse
+        the newly appended lines and add them to :attr:`XVG.array`
+        (which grows in place, with doubling of the allocated space when
+        required). If the file became smaller than at the previous call
+        (e.g. it was overwritten by a restarted job) then it is read
+        again from the beginning.
+
+        A last line without a terminating newline is assumed to be still
+        in the process of being written and is left for the next call
+        unless *final* = ``True``.
+
+        Only uncompressed files can be followed; a :exc:`ValueError` is
+        raised for compressed files.
+
+        :Returns: number of new rows of data
+        """
+        if os.path.splitext(self.real_filename)[1] in ('.gz', '.bz2', '.xz'):
+            raise ValueError("{0!s}: Only uncompressed files can be "
+                             "read incrementally.".format(self.real_filename))
+        tail = self.__tail
+        if tail is None or os.path.getsize(self.real_filename) < tail['offset']:
+            tail = self.__tail = {'offset': 0, 'lineno': 0, 'irow': 0,
+                                  'ncol': None, 'buffer': None}
+            self.corrupted_lineno = []
+            self.__array = numpy.array([])
+            self.clear_cache()
+        stride = self.stride
+        nnew = 0
+        with open(self.real_filename, 'rb') as xvg:
+            xvg.seek(tail['offset'])
+            incomplete = False
+            while not incomplete:
+                lines = xvg.readlines(self.refresh_readsize)
+                if lines and not final and not lines[-1].endswith(b'\n'):
+                    lines.pop()  # still being written
+                    incomplete = True
+                if not lines:
+                    break
+                data = b"".join(lines)
+                tail['offset'] += len(data)
+                text = io.StringIO(data.decode('utf-8', 'replace'))
+                del data
+                for rows, ndata in self._iterblocks(text, header=not self.__headerparsed,
+                                                    lineno=tail['lineno'], ncol=tail['ncol'],
+                                                    stride=stride, irow=tail['irow']):
+                    self.__headerparsed = True
+                    tail['irow'] += ndata
+                    if len(rows) == 0:
+                        continue
+                    if tail['buffer'] is None:
+                        tail['ncol'] = rows.shape[1]
+                        tail['buffer'] = _ColumnBuffer(tail['ncol'], dtype=self.dtype)
+                    tail['buffer'].append(rows)
+                    nnew += len(rows)
+                tail['lineno'] += len(lines)
+        if tail['buffer'] is not None:
+            self.__array = tail['buffer'].array
+        if nnew > 0:
+            self.clear_cache()
+        return nnew
+
+    def iterchunks(self, nrows=None, columns=None):
+        """Iterate over the data in chunks of *nrows* rows.
+
+        The file is read and converted incrementally so that only a
+        single chunk of data is kept in memory at any time; this makes
+        it possible to compute reductions over files that are bigger
+        than the available memory. The header is only processed the
+        first time the file is read. Every *stride* row is used as for
+        :meth:`XVG.parse`. If the data were already loaded (e.g. with
+        :meth:`XVG.set`) then chunks of :attr:`XVG.array` are returned.
+
+        :Keywords:
+           *nrows*
+               number of rows in each chunk; the last chunk can contain
+               fewer rows [:attr:`XVG.parse_blocksize`]
+           *columns*
+               list of columns to include in the chunks; the default is
+               to use all columns.
+
+        :Returns: generator of arrays of shape ``(ncolumns, nrows)``, with
+                  column-first indexing as in :attr:`XVG.array`
+
+        .. Warning::
+
+           When reading from file, the same buffer is used for all chunks,
+           i.e. a chunk is overwritten by the next one. Make a copy if you
+           need to keep the data of a chunk.
+        """
+        nrows = nrows or self.parse_blocksize
+        if columns is None:
+            columns = slice(None)
+        if self.__array is not None:
+            for start in range(0, self.__array.shape[-1], nrows):
+                yield self.__array[:, start:start+nrows][columns]
+            return
+
+        self.corrupted_lineno = []
+        buf = None
+        fill = 0
+        with utilities.openany(self.real_filename) as xvg:
+            for rows, ndata in self._iterblocks(xvg, header=not self.__headerparsed,
+                                                stride=self.stride):
+                self.__headerparsed = True
+                if len(rows) == 0:
+                    continue
+                rows = rows[:, columns]
+                if buf is None:
+                    buf = numpy.empty((rows.shape[1], nrows), dtype=self.dtype)
+                start = 0
+                while start < len(rows):
+                    n = min(nrows - fill, len(rows) - start)
+                    buf[:, fill:fill+n] = rows[start:start+n].T
+                    fill += n
+                    start += n
+                    if fill == nrows:
+                        yield buf
+                        fill = 0
+        if fill > 0:
+            yield buf[:, :fill]
+
+    def _iterblocks(self, stream, header=True, lineno=0, ncol=None, stride=1, irow=0):
+        """Generate blocks of data rows from the lines in *stream*.
+
+        Reads :attr:`XVG.parse_blocksize` lines at a time. The lines of
+        a block up to the last header (``#``, ``@``) or multi-data
+        (``&``) line are processed by :meth:`XVG._parse_lines`, which
+        handles the header; all following data lines are converted in
+        bulk by :meth:`XVG._convert_rows`. Lines that cannot be converted
+        are processed by :meth:`XVG._parse_lines`, which skips corrupted
+        lines when :attr:`XVG.permissive` is set and records them in
+        :attr:`XVG.corrupted_lineno`.
+
+        Only every *stride* data line is kept. The lines are selected
+        *before* they are converted so that discarded lines are never
+        converted or checked; *irow* is the number of data lines that
+        preceded *stream* (so that the selection can be continued across
+        calls).
+
+        With *header* = ``False`` header lines are skipped without
+        extracting any metadata. *lineno* is the line number of the first
+        line in *stream* (for error messages) and *ncol* the number of
+        columns that the data must have (if known). Lines of byte streams
+        (compressed files opened by :func:`gromacs.utilities.anyopen`)
+        are decoded as UTF-8.
+
+        :Returns: generator of tuples ``(rows, ndata)`` with a 2D array
+                  *rows* of shape ``(nrows, ncol)`` and the number
+                  *ndata* of data lines (kept or not) in the block
+        """
+        if ncol is None and self.usecols is not None:
+            ncol = len(self.usecols)
+        nfields = None     # number of fields in a data line
+        while True:
+            lines = list(itertools.islice(stream, self.parse_blocksize))
+            if not lines:
+                break
+            if isinstance(lines[0], bytes) and not isinstance(lines[0], str):
+                # compressed files are byte streams under Python 3
+                lines = list(io.StringIO(b"".join(lines).decode('utf-8', 'replace')))
+            text = "".join(lines)
+            # lines up to the last header/multi-data line are parsed one by one
+            last = max(text.rfind('#'), text.rfind('@'), text.rfind('&'))
+            if last >= 0:
+                nhead = text.count('\n', 0, last) + 1
+                rows, ndata = self._parse_lines(lines[:nhead], lineno, ncol, header=header,
+                                                stride=stride, irow=irow)
+                lineno += nhead
+                irow += ndata
+                if len(rows) > 0:
+                    ncol = rows.shape[1]
+                if ndata > 0:
+                    yield rows, ndata
+                lines = lines[nhead:]
+                text = text[text.find('\n', last) + 1:] if lines else ""
+            if not text.strip():
+                lineno += len(lines)
+                continue
+            # bulk conversion of the remaining data lines
+            positions = None    # indices in lines of the data lines (if not regular)
+            if _BLANK_LINE.search(text) or not lines[0].strip() or not lines[-1].strip():
+                positions = [i for i, line in enumerate(lines) if line.strip()]
+            del text
+            ndata = len(lines) if positions is None else len(positions)
+            first = (-irow) % stride
+            if positions is not None:
+                positions = positions[first::stride]
+                data = [lines[i] for i in positions]
+                position = positions.__getitem__
+            else:
+                data = lines[first::stride] if stride > 1 else lines
+                position = lambda j, first=first: first + j * stride
+            rows, nfields = self._convert_rows(data, lambda j: lineno + position(j),
+                                               ncol=ncol, nfields=nfields)
+            del data
+            lineno += len(lines)
+            irow += ndata
+            if len(rows) > 0:
+                ncol = rows.shape[1]
+            if ndata > 0:
+                yield rows, ndata
+
+    def _convert_rows(self, data, lineno, ncol=None, nfields=None):
+        """Convert the data lines *data* to a 2D array of rows.
+
+        The lines are converted in bulk with :func:`numpy.fromstring`.
+        Only lines that are not rows of *nfields* numbers (the number of
+        fields of the first line if not known) are processed one by one
+        by :meth:`XVG._parse_lines`, which skips them when
+        :attr:`XVG.permissive` is set; the lines after a bad line are
+        again converted in bulk. *lineno* is a function that returns the
+        (0-based) line number in the file of ``data[j]``.
+
+        :Returns: tuple ``(rows, nfields)``
+        """
+        pieces = []
+        start = 0
+        size = len(data)
+        while start < len(data):
+            chunk = data[start:start + size]
+            n = nfields
+            if n is None:
+                n = ncol if ncol is not None and self.usecols is None else len(chunk[0].split())
+            good = 0
+            if self.usecols is None or max(self.usecols) < n:
+                values, good = _convert_prefix(chunk, n, self.dtype)
+            if good > 0:
+                nfields = n
+                rows = values[:good * n].reshape(good, n)
+                if self.usecols is not None:
+                    rows = rows[:, self.usecols]
+                pieces.append(rows)
+                ncol = rows.shape[1]
+                start += good
+            if good < len(chunk):
+                # the first line that failed is parsed on its own
+                rows, ndata = self._parse_lines(data[start:start + 1], lineno(start), ncol,
+                                                header=False)
+                if len(rows) > 0:
+                    pieces.append(rows)
+                    ncol = rows.shape[1]
+                start += 1
+                size = 1024     # more bad lines are likely: try smaller chunks
+            else:
+                size *= 4
+        if not pieces:
+            return numpy.empty((0, ncol or 0), dtype=self.dtype), nfields
+        if len(pieces) == 1:
+            return pieces[0], nfields
+        return numpy.concatenate(pieces), nfields
+
+    def _parse_header(self, line):
+        """Extract axis labels, legends and column names from a header *line*."""
+        if "label" in line and "xaxis" in line:
+            self.xaxis = line.split('"')[-2]
+        if "label" in line and "yaxis" in line:
+            self.yaxis = line.split('"')[-2]
+        if line.startswith("@ legend"):
+            if not "legend" in self.metadata: self.metadata["legend"] = []
+            self.metadata["legend"].append(line.split("legend ")[-1])
+        if line.startswith("@ s") and "subtitle" not in line:
+            m = re.match(r'@ s(\d+)', line)
+            if self.usecols is not None and m and int(m.group(1)) + 1 not in self.usecols:
+                return  # legend of a column that is not read
+            name = line.split("legend ")[-1].replace('"','').strip()
+            self.names.append(name)
+
+    def _parse_lines(self, lines, lineno=0, ncol=None, header=True, stride=1, irow=0):
+        """Parse *lines* one by one and return the data as 2D array of rows.
+
+        *lineno* is the (0-based) line number of the first line in the
+        file and *ncol* the number of columns of previously read data
+        (if any); all data lines must have the same number of columns.
+        Metadata are only extracted from header lines if *header* is
+        ``True``. Only every *stride* data line is converted, starting
+        with the data line number *irow* (see :meth:`XVG._iterblocks`).
+
+        :Returns: tuple ``(rows, ndata)`` with the 2D array of rows and
+                  the total number of data lines in *lines*
+        """
+        rows = []
+        idata = irow
+        if ncol is None and self.usecols is not None:
+            ncol = len(self.usecols)
+        for lineno,line in enumerate(lines, lineno):
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            if line.startswith(('#', '@')) :
+                if header:
+                    self._parse_header(line)
+                continue
+            if line.startswith('&'):
+                raise NotImplementedError('{0!s}: Multi-data not supported, only simple NXY format.'.format(self.real_filename))
+            idata += 1
+            if (idata - 1) % stride != 0:
+                continue   # not converted at all
+            # parse line as floats
+            try:
+                row = self._convert(line)
+            except:
+                if self.permissive:
+                    self.logger.warn("%s: SKIPPING unparsable line %d: %r",
+                                     self.real_filename, lineno+1, line)
+                    self.corrupted_lineno.append(lineno+1)
+                    continue
+                self.logger.error("%s: Cannot parse line %d: %r",
+                                  self.real_filename, lineno+1, line)
+                raise
+            # check for same number of columns as in previous step
+            if ncol is not None and len(row) != ncol:
+                if self.permissive:
+                    self.logger.warn("%s: SKIPPING line %d with wrong number of columns: %r",
+                                     self.real_filename, lineno+1, line)
+                    self.corrupted_lineno.append(lineno+1)
+                    continue
+                errmsg = "{0!s}: Wrong number of columns in line {1:d}: {2!r}".format(self.real_filename, lineno+1, line)
+                self.logger.error(errmsg)
+                raise IOError(errno.ENODATA, errmsg, self.real_filename)
+            # finally: a good line
+            ncol = len(row)
+            rows.append(row)
+        return numpy.array(rows, dtype=self.dtype).reshape(len(rows), ncol or 0), idata - irow
+
+    def _convert(self, line):
+        """Convert the selected columns (see *usecols*) of a data *line* to floats.
+
+        Missing columns are left out so that the row is detected as
+        having the wrong number of columns.
+        """
+        fields = line.split()
+        if self.usecols is None:
+            return list(map(float, fields))
+        return [float(fields[i]) for i in self.usecols if i < len(fields)]
 
     def to_df(self):
         import pandas as _pd
@@ -542,6 +2371,8 @@ class XVG(utilities.FileUtils):
         No sanity checks at the moment...
         """
         self.__array = numpy.asarray(a)
+        self.__tail = None
+        self.clear_cache()
 
     def plot(self, **kwargs):
         """Plot xvg file data.
@@ -585,7 +2416,7 @@ class XVG(utilities.FileUtils):
 
         columns = kwargs.pop('columns', Ellipsis)         # slice for everything
         maxpoints = kwargs.pop('maxpoints', self.maxpoints_default)
-        transform = kwargs.pop('transform', lambda x: x)  # default is identity transformation
+        transform = kwargs.pop('transform', None)  # default is identity transformation
         method = kwargs.pop('method', "mean")
 
         if columns is Ellipsis or columns is None:
@@ -611,7 +2442,13 @@ class XVG(utilities.FileUtils):
             colors = cycle(utilities.asiterable(color))
 
         # (decimate/smooth o slice o transform)(array)
-        a = self.decimate(method, numpy.asarray(transform(a))[columns], maxpoints=maxpoints)
+        if transform is None:
+            # decimated data of the untransformed array are cached for repeated plots
+            key = ('decimated', method, maxpoints, tuple(numpy.ravel(columns).tolist()))
+            a = self._derived(key, lambda: self.decimate(method, numpy.asarray(a)[columns],
+                                                         maxpoints=maxpoints))
+        else:
+            a = self.decimate(method, numpy.asarray(transform(a))[columns], maxpoints=maxpoints)
 
         # now deal with infs, nans etc AFTER all transformations (needed for plotting across inf/nan)
         ma = numpy.ma.MaskedArray(a, mask=numpy.logical_not(numpy.isfinite(a)))
@@ -838,6 +2675,12 @@ class XVG(utilities.FileUtils):
 
           * "min" and "max* select the extremum in each bin
 
+          * "lttb", uses :meth:`XVG.decimate_lttb` to select data points
+            with the Largest-Triangle-Three-Buckets algorithm
+
+          * "minmax", uses :meth:`XVG.decimate_minmax` for the envelope
+            of the data (minimum and maximum of each bin)
+
           * "rms", uses :meth:`XVG.decimate_rms` to coarse grain by
             computing the root mean square sum of the data in bins
             along the time axis (for averaging standard deviations and
@@ -863,6 +2706,8 @@ class XVG(utilities.FileUtils):
                    'percentile': self.decimate_percentile,
                    'error': self.decimate_error,  # undocumented, not working well
                    'circmean': self.decimate_circmean,
+                   'lttb': self.decimate_lttb,
+                   'minmax': self.decimate_minmax,
                    }
         if len(a.shape) == 1:
             # add first column as index
@@ -879,10 +2724,10 @@ class XVG(utilities.FileUtils):
         """Return data *a* mean-decimated on *maxpoints*.
 
         Histograms each column into *maxpoints* bins and calculates
-        the weighted average in each bin as the decimated data, using
-        :func:`numkit.timeseries.mean_histogrammed_function`. The coarse grained
-        time in the first column contains the centers of the histogram
-        time.
+        the weighted average in each bin as the decimated data (as
+        :func:`numkit.timeseries.mean_histogrammed_function` but for
+        all columns at once). The coarse grained time in the first
+        column contains the centers of the histogram time.
 
         If *a* contains <= *maxpoints* then *a* is simply returned;
         otherwise a new array of the same dimensions but with a
@@ -893,17 +2738,16 @@ class XVG(utilities.FileUtils):
            Assumes that the first column is time.
 
         """
-        return self._decimate(numkit.timeseries.mean_histogrammed_function, a, maxpoints, **kwargs)
+        return self._decimate("mean", a, maxpoints, **kwargs)
 
     def decimate_circmean(self, a, maxpoints, **kwargs):
         """Return data *a* circmean-decimated on *maxpoints*.
 
         Histograms each column into *maxpoints* bins and calculates
-        the weighted circular mean in each bin as the decimated data,
-        using
-        :func:`numkit.timeseries.circmean_histogrammed_function`. The
-        coarse grained time in the first column contains the centers
-        of the histogram time.
+        the weighted circular mean in each bin as the decimated data
+        (as :func:`numkit.timeseries.circmean_histogrammed_function`
+        but for all columns at once). The coarse grained time in the
+        first column contains the centers of the histogram time.
 
         If *a* contains <= *maxpoints* then *a* is simply returned;
         otherwise a new array of the same dimensions but with a
@@ -928,7 +2772,7 @@ class XVG(utilities.FileUtils):
 
         """
         a_rad = numpy.vstack((a[0], numpy.deg2rad(a[1:])))
-        b = self._decimate(numkit.timeseries.circmean_histogrammed_function, a_rad, maxpoints, **kwargs)
+        b = self._decimate("circmean", a_rad, maxpoints, **kwargs)
         y_ma, x_ma = break_array(b[1], threshold=numpy.pi, other=b[0])
         v = [y_ma]
         for y in b[2:]:
@@ -941,10 +2785,10 @@ class XVG(utilities.FileUtils):
         """Return data *a* min-decimated on *maxpoints*.
 
         Histograms each column into *maxpoints* bins and calculates
-        the minimum in each bin as the decimated data, using
-        :func:`numkit.timeseries.min_histogrammed_function`. The coarse grained
-        time in the first column contains the centers of the histogram
-        time.
+        the minimum in each bin as the decimated data (as
+        :func:`numkit.timeseries.min_histogrammed_function` but for
+        all columns at once). The coarse grained time in the first
+        column contains the centers of the histogram time.
 
         If *a* contains <= *maxpoints* then *a* is simply returned;
         otherwise a new array of the same dimensions but with a
@@ -955,16 +2799,16 @@ class XVG(utilities.FileUtils):
            Assumes that the first column is time.
 
         """
-        return self._decimate(numkit.timeseries.min_histogrammed_function, a, maxpoints, **kwargs)
+        return self._decimate("min", a, maxpoints, **kwargs)
 
     def decimate_max(self, a, maxpoints, **kwargs):
         """Return data *a* max-decimated on *maxpoints*.
 
         Histograms each column into *maxpoints* bins and calculates
-        the maximum in each bin as the decimated data, using
-        :func:`numkit.timeseries.max_histogrammed_function`. The coarse grained
-        time in the first column contains the centers of the histogram
-        time.
+        the maximum in each bin as the decimated data (as
+        :func:`numkit.timeseries.max_histogrammed_function` but for
+        all columns at once). The coarse grained time in the first
+        column contains the centers of the histogram time.
 
         If *a* contains <= *maxpoints* then *a* is simply returned;
         otherwise a new array of the same dimensions but with a
@@ -975,16 +2819,16 @@ class XVG(utilities.FileUtils):
            Assumes that the first column is time.
 
         """
-        return self._decimate(numkit.timeseries.max_histogrammed_function, a, maxpoints, **kwargs)
+        return self._decimate("max", a, maxpoints, **kwargs)
 
     def decimate_rms(self, a, maxpoints, **kwargs):
         """Return data *a* rms-decimated on *maxpoints*.
 
         Histograms each column into *maxpoints* bins and calculates
-        the root mean square sum in each bin as the decimated data,
-        using :func:`numkit.timeseries.rms_histogrammed_function`. The coarse
-        grained time in the first column contains the centers of the
-        histogram time.
+        the root mean square sum in each bin as the decimated data (as
+        :func:`numkit.timeseries.rms_histogrammed_function` but for
+        all columns at once). The coarse grained time in the first
+        column contains the centers of the histogram time.
 
         If *a* contains <= *maxpoints* then *a* is simply returned;
         otherwise a new array of the same dimensions but with a
@@ -995,16 +2839,16 @@ class XVG(utilities.FileUtils):
            Assumes that the first column is time.
 
         """
-        return self._decimate(numkit.timeseries.rms_histogrammed_function, a, maxpoints, **kwargs)
+        return self._decimate("rms", a, maxpoints, **kwargs)
 
     def decimate_percentile(self, a, maxpoints, **kwargs):
         """Return data *a* percentile-decimated on *maxpoints*.
 
         Histograms each column into *maxpoints* bins and calculates
-        the percentile *per* in each bin as the decimated data, using
-        :func:`numkit.timeseries.percentile_histogrammed_function`. The
-        coarse grained time in the first column contains the centers
-        of the histogram time.
+        the percentile *per* in each bin as the decimated data (as
+        :func:`numkit.timeseries.percentile_histogrammed_function` but
+        for all columns at once). The coarse grained time in the first
+        column contains the centers of the histogram time.
 
         If *a* contains <= *maxpoints* then *a* is simply returned;
         otherwise a new array of the same dimensions but with a
@@ -1022,16 +2866,16 @@ class XVG(utilities.FileUtils):
 
         .. SeeAlso:: :func:`numkit.timeseries.regularized_function` with :func:`scipy.stats.scoreatpercentile`
         """
-        return self._decimate(numkit.timeseries.percentile_histogrammed_function, a, maxpoints, **kwargs)
+        return self._decimate("percentile", a, maxpoints, **kwargs)
 
     def decimate_error(self, a, maxpoints, **kwargs):
         """Return data *a* error-decimated on *maxpoints*.
 
         Histograms each column into *maxpoints* bins and calculates an
-        error estimate in each bin as the decimated data, using
-        :func:`numkit.timeseries.error_histogrammed_function`. The
-        coarse grained time in the first column contains the centers
-        of the histogram time.
+        error estimate in each bin as the decimated data (as
+        :func:`numkit.timeseries.error_histogrammed_function` but for
+        all columns and bins at once). The coarse grained time in the
+        first column contains the centers of the histogram time.
 
         If *a* contains <= *maxpoints* then *a* is simply returned;
         otherwise a new array of the same dimensions but with a
@@ -1049,21 +2893,99 @@ class XVG(utilities.FileUtils):
         """
         warnings.warn("Using undocumented decimate_error() is highly EXPERIMENTAL",
                       category=LowAccuracyWarning)
-        return self._decimate(numkit.timeseries.error_histogrammed_function, a, maxpoints, **kwargs)
+        return self._decimate("error", a, maxpoints, dt=numpy.mean(numpy.diff(a[0])), **kwargs)
+
+    def decimate_lttb(self, a, maxpoints, **kwargs):
+        """Return *maxpoints* data points of *a* selected with LTTB.
+
+        The Largest-Triangle-Three-Buckets algorithm (S. Steinarsson,
+        "Downsampling Time Series for Visual Representation", MSc
+        thesis, University of Iceland, 2013) keeps the first and last
+        point and divides the other points into *maxpoints* - 2 buckets
+        of equal size. From each bucket, the point that forms the
+        largest triangle with the point selected in the previous bucket
+        and the average of the next bucket is kept. The selected points
+        are original data points (with exact times) and peaks are
+        preserved.
+
+        All columns are processed together; because they share the time
+        in the first column, the same points are selected for all
+        columns, namely those with the largest sum of the triangle areas
+        of all columns (each column is scaled by its range). For a
+        single data column this is the original algorithm.
+
+        .. Note::
+
+           Assumes that the first column is time.
+
+        """
+        ny = a.shape[-1]
+        if numpy.any(a[0, 1:] < a[0, :-1]):
+            a = a[:, numpy.argsort(a[0], kind='mergesort')]
+        out = a[:, _lttb_indices(a[0], a[1:], maxpoints)]
+        if maxpoints == self.maxpoints_default:  # only warn if user did not set maxpoints
+            warnings.warn("Plot had %d datapoints > maxpoints = %d; decimated to %d points "
+                          "with the Largest-Triangle-Three-Buckets algorithm."
+                          % (ny, maxpoints, maxpoints),
+                          category=AutoCorrectionWarning)
+        return out
+
+    def decimate_minmax(self, a, maxpoints, **kwargs):
+        """Return the min/max envelope of data *a* on *maxpoints* points.
+
+        Histograms each column into *maxpoints*/2 bins (as
+        :meth:`XVG.decimate_min`) and returns two points for each bin,
+        the minimum and the maximum in the order in which they occur in
+        the bin, both at the center of the bin. A line through the
+        points covers every excursion of the data.
+
+        .. Note::
+
+           Assumes that the first column is time.
+
+        """
+        ny = a.shape[-1]   # assume 2D array with last dimension varying fastest
+        nbins = max(maxpoints // 2, 1)
+        out = numpy.zeros((a.shape[0], 2 * nbins), dtype=float)
+
+        edges, order, bounds = _histogram_bins(a[0], nbins)
+        out[0] = numpy.repeat(0.5*(edges[:-1] + edges[1:]), 2)
+        if a.shape[0] > 1:
+            y = a[1:] if order is None else a[1:, order]
+            y = numpy.asarray(y[:, bounds[0]:bounds[-1]], dtype=float)
+            out[1:, 0::2], out[1:, 1::2] = _binned_envelope(y, bounds - bounds[0])
+
+        if maxpoints == self.maxpoints_default:  # only warn if user did not set maxpoints
+            warnings.warn("Plot had %d datapoints > maxpoints = %d; decimated to the minima and "
+                          "maxima in %d regularly spaced bins."
+                          % (ny, maxpoints, nbins),
+                          category=AutoCorrectionWarning)
+        return out
 
-    def _decimate(self, func, a, maxpoints, **kwargs):
+    def _decimate(self, method, a, maxpoints, **kwargs):
+        """Reduce the data columns of *a* in *maxpoints* bins along the time a[0].
+
+        All columns are binned together: the samples are sorted into
+        the bins once and *method* (a key of :data:`_binned_reductions`)
+        is applied to all columns and bins with vectorized operations.
+        Bins are defined as in
+        :func:`numkit.timeseries.regularized_function` and empty bins
+        are set to NaN.
+        """
         ny = a.shape[-1]   # assume 2D array with last dimension varying fastest
         out = numpy.zeros((a.shape[0], maxpoints), dtype=float)
 
-        t = a[0]
-        for i in range(1, a.shape[0]):
-            # compute regularised data for each column separately
-            out[i], out[0] = func(t, a[i], bins=maxpoints, **kwargs)
+        edges, order, bounds = _histogram_bins(a[0], maxpoints)
+        out[0] = 0.5*(edges[:-1] + edges[1:])
+        if a.shape[0] > 1:
+            y = a[1:] if order is None else a[1:, order]
+            y = numpy.asarray(y[:, bounds[0]:bounds[-1]], dtype=float)
+            out[1:] = _binned_reductions[method](y, bounds - bounds[0], **kwargs)
 
         if maxpoints == self.maxpoints_default:  # only warn if user did not set maxpoints
             warnings.warn("Plot had %d datapoints > maxpoints = %d; decimated to %d regularly "
                           "spaced points from the histogrammed data with %s()."
-                          % (ny, maxpoints, maxpoints, func.__name__),
+                          % (ny, maxpoints, maxpoints, method),
                           category=AutoCorrectionWarning)
         return out
 
@@ -1079,6 +3001,8 @@ class XVG(utilities.FileUtils):
         otherwise a new array of the same dimensions but with a
         reduced number of points (close to *maxpoints*) is returned.
 
+        All columns are smoothed together with :func:`smooth`.
+
         .. Note::
 
            Assumes that the first column is time (which will *never*
@@ -1101,9 +3025,7 @@ class XVG(utilities.FileUtils):
 
         # smoothed
         out[0,:] = a[0]
-        for i in range(1, a.shape[0]):
-            # process columns because smooth() only handles 1D arrays :-p
-            out[i,:] = numkit.timeseries.smooth(a[i], stepsize, window=window)
+        out[1:] = smooth(a[1:], stepsize, window=window)
 
         if maxpoints == self.maxpoints_default:  # only warn if user did not set maxpoints
             warnings.warn("Plot had %d datapoints > maxpoints = %d; decimated to %d regularly "
@@ -1117,21 +3039,40 @@ class XVG(utilities.FileUtils):
 
         If :attr:`XVG.savedata` is ``False`` then any attributes in
         :attr:`XVG.__pickle_excluded` are *not* pickled as they are but simply
-        pickled with the default value.
+        pickled with the default value; this includes all results computed
+        from the data, which are recomputed after the file is parsed again.
+
+        Otherwise the array is pickled as a C-contiguous
+        :class:`numpy.ndarray` (also when it is memory-mapped from the
+        cache), which pickle protocol 5 passes as a single out-of-band
+        buffer. Of the derived arrays only the statistics are kept. The
+        autocorrelation functions are never pickled.
+
+        The state of :meth:`XVG.refresh` (with its over-allocated buffer)
+        and the index of :meth:`XVG.read_window` are always dropped; they
+        are rebuilt from the file when needed.
         """
-        if self.savedata:
-            d = self.__dict__
-        else:
-            # do not pickle the big array cache
-            mangleprefix = '_'+self.__class__.__name__
-            def demangle(k):
-                """_XVG__array --> __array"""
-                if k.startswith(mangleprefix):
-                    k = k.replace(mangleprefix,'')
-                return k
-            d = {}
-            for k in self.__dict__:
-                d[k] = self.__pickle_excluded.get(demangle(k), self.__dict__[k])
+        mangleprefix = '_'+self.__class__.__name__
+        def demangle(k):
+            """_XVG__array --> __array"""
+            if k.startswith(mangleprefix):
+                k = k.replace(mangleprefix,'')
+            return k
+        d = {}
+        for k, value in self.__dict__.items():
+            key = demangle(k)
+            if key in self.__pickle_dropped:
+                continue
+            if not self.savedata and key in self.__pickle_excluded:
+                # do not pickle the big array cache
+                value = self.__pickle_excluded[key]
+            elif key == '__array' and value is not None:
+                value = numpy.ascontiguousarray(value)
+            elif key == '__derived':
+                value = {name: v for name, v in value.items() if name in self._statistics}
+            elif key == '__cache':
+                value = {name: v for name, v in value.items() if name != 'acf'}
+            d[k] = value
         return d
 
     def __setstate__(self, d):
@@ -1141,9 +3082,790 @@ class XVG(utilities.FileUtils):
             warnings.warn(wmsg, category=DeprecationWarning)
             self.logger.warn(wmsg)
             d['savedata'] = False  # new default
+        for cache in '_XVG__derived', '_XVG__cache':
+            if d.get(cache) is None:
+                d[cache] = {}   # every instance needs its own cache
         self.__dict__.update(d)
 
 
+def load_stacked(filenames, nprocs=None, tol=1e-6, **kwargs):
+    """Read many xvg files concurrently into a single 3D array.
+
+    All files must contain the same number of columns and rows and the
+    same time (first column) up to *tol*, as for instance the output
+    of the same analysis for different replicas of a replica exchange
+    simulation. Reductions over replicas are then simply reductions
+    along the first axis, e.g. ``a.mean(axis=0)``.
+
+    :Arguments:
+       *filenames*
+           list of xvg files
+       *nprocs*
+           number of processes that parse files in parallel; ``None``
+           uses all cores [``None``]
+       *tol*
+           largest absolute difference of the times in different files
+           [1e-6]
+       *kwargs*
+           all other keyword arguments (e.g. *permissive*, *stride*,
+           *dtype*, *usecols*) are passed to :class:`XVG`
+
+    :Returns: tuple ``(a, names)`` with the array *a* of shape
+              ``(nfiles, ncols, nrows)`` and the column names (legends)
+              of the first file
+
+    :Raises: :exc:`ValueError` if the files do not contain the same
+             number of rows and columns or the time axes differ
+    """
+    filenames = list(filenames)
+    if not filenames:
+        raise ValueError("No xvg files to load.")
+    if nprocs is None:
+        nprocs = multiprocessing.cpu_count()
+    nprocs = min(nprocs, len(filenames))
+    tasks = [(filename, kwargs) for filename in filenames]
+    if nprocs > 1:
+        with _process_pool(nprocs) as pool:
+            return _stack_results(filenames, pool.imap(_load_one, tasks), tol)
+    return _stack_results(filenames, map(_load_one, tasks), tol)
+
+def _stack_results(filenames, results, tol):
+    """Check and stack the ``(array, names)`` *results* for *filenames* (see :func:`load_stacked`)."""
+    a = names = None
+    for i, (filename, (array, xnames)) in enumerate(zip(filenames, results)):
+        if a is None:
+            a = numpy.empty((len(filenames),) + array.shape, dtype=array.dtype)
+            names = xnames
+        elif array.shape != a.shape[1:]:
+            raise ValueError("{0!s}: shape {1!r} differs from shape {2!r} of {3!s}".format(
+                filename, array.shape, a.shape[1:], filenames[0]))
+        elif numpy.any(numpy.abs(array[0] - a[0, 0]) > tol):
+            raise ValueError("{0!s}: time axis differs from {1!s}".format(filename, filenames[0]))
+        elif xnames != names:
+            XVG.logger.warning("%s: column names %r differ from %r in %s",
+                               filename, xnames, names, filenames[0])
+        a[i] = array
+    return a, names
+
+def _load_one(task):
+    """Parse a single xvg file for :func:`load_stacked` (worker process)."""
+    filename, kwargs = task
+    xvg = XVG(filename, **kwargs)
+    return xvg.array, xvg.names
+
+
+def autocorrelation_fft(a):
+    """Calculate the autocorrelation functions of all rows of *a*.
+
+    The same conventions as for
+    :func:`numkit.timeseries.autocorrelation_fft` (with the default
+    arguments) are used: the mean is subtracted from each series, the
+    ACF is corrected for the zero padding and ``acf[:, 0]`` is the
+    variance of each series. All rows are transformed with a single
+    batched real FFT whose length is only determined once.
+
+    :Arguments:
+       *a*
+          array of shape ``(M, N)`` with *M* time series of length *N*
+          (a 1D array is treated as a single series)
+
+    :Returns: array of shape ``(M, N)`` with the ACFs for lags 0 to N-1
+    """
+    a = numpy.atleast_2d(numpy.asarray(a, dtype=float))
+    N = a.shape[-1]
+    a = a - a.mean(axis=-1)[:, numpy.newaxis]
+    # pad to a power of 2 >= 2N-1 to avoid the circular wrap-around
+    nfft = 2**int(numpy.ceil(numpy.log2(max(2*N - 1, 1))))
+    F = numpy.fft.rfft(a, n=nfft, axis=-1)
+    acf = numpy.fft.irfft(F.real**2 + F.imag**2, n=nfft, axis=-1)[:, :N]
+    acf /= N - numpy.arange(N)  # correct for 0 padding
+    return acf
+
+
+def statistical_inefficiency(a, mintime=3):
+    """Statistical inefficiency g of all rows of *a*.
+
+    g = 1 + 2 sum_{t=1}^{N-1} (1 - t/N) C(t) with the normalized
+    autocorrelation function C(t) (computed for all rows together with
+    :func:`autocorrelation_fft`). As in [Chodera2016]_ the sum is
+    truncated where C(t) first drops to zero or below but not before
+    *mintime*. The number of uncorrelated samples is N/g.
+
+    .. [Chodera2016] J. D. Chodera, A simple method for automated
+                     equilibration detection in molecular simulations.
+                     J Chem Theory Comput 12 (2016), 1799--1805.
+                     doi:10.1021/acs.jctc.5b00784
+
+    :Returns: array with g >= 1 for each row (1 for a constant series)
+    """
+    acf = autocorrelation_fft(a)
+    N = acf.shape[-1]
+    var = acf[:, :1]
+    C = numpy.divide(acf, var, out=numpy.zeros_like(acf), where=var > 0)
+    t = numpy.arange(N)
+    stop = (C <= 0) & (t >= mintime)
+    stop[:, -1] = True
+    cut = numpy.argmax(stop, axis=1)      # first lag that is not included
+    terms = (1. - t / float(N)) * C
+    terms[:, 0] = 0
+    g = 1 + 2 * numpy.cumsum(terms, axis=1)[numpy.arange(len(C)), numpy.maximum(cut - 1, 0)]
+    return numpy.maximum(g, 1.)
+
+def _simpson():
+    """Return Simpson's rule integrator from :mod:`scipy.integrate`."""
+    import scipy.integrate
+    try:
+        return scipy.integrate.simpson
+    except AttributeError:
+        return scipy.integrate.simps  # scipy < 1.6
+
+
+def smooth(a, window_len=11, window='flat'):
+    """Smooth all rows of *a* with a window of size *window_len*.
+
+    Same as :func:`numkit.timeseries.smooth` (including the reflection
+    of the signal at both ends) but for a 2D array *a* of shape ``(M,
+    N)``, whose *M* rows are smoothed at once. The "flat" window (a
+    running average) is computed from cumulative sums in O(N)
+    independent of *window_len*; other windows ("hanning", "hamming",
+    "bartlett", "blackman" or an array of weights) are convolved with
+    :func:`numpy.convolve`.
+
+    :Returns: smoothed array of the same shape as *a*
+    """
+    windows = {'flat': lambda n: numpy.ones(n, dtype=float),
+               'hanning': numpy.hanning,
+               'hamming': numpy.hamming,
+               'bartlett': numpy.bartlett,
+               'blackman': numpy.blackman,
+               }
+    a = numpy.atleast_2d(numpy.asarray(a, dtype=float))
+    window_len = int(window_len)
+    if isinstance(window, numpy.ndarray):
+        window_len = len(window)
+        w = numpy.asarray(window, dtype=float)
+    else:
+        try:
+            w = windows[window](window_len)
+        except KeyError:
+            raise ValueError("Window {0!r} not supported; must be one of {1!r}".format(window, list(windows.keys())))
+    n = a.shape[-1]
+    if n < window_len:
+        raise ValueError("Input vector needs to be bigger than window size.")
+    if window_len % 2 == 0:
+        raise ValueError("window_len should be an odd integer")
+    if window_len < 3:
+        return a
+
+    s = numpy.concatenate((a[:, window_len-1:0:-1], a, a[:, -1:-window_len:-1]), axis=1)
+    h = (window_len - 1)//2
+    if not isinstance(window, numpy.ndarray) and window == 'flat' and numpy.all(numpy.isfinite(a)):
+        # running average from the cumulative sum (of the fluctuations
+        # around the mean to limit round-off errors)
+        ref = a.mean(axis=1)[:, numpy.newaxis]
+        c = numpy.zeros((s.shape[0], s.shape[1] + 1))
+        numpy.cumsum(s - ref, axis=1, out=c[:, 1:])
+        return (c[:, h+window_len:h+window_len+n] - c[:, h:h+n])/window_len + ref
+    # non-finite values must stay local, which a cumulative sum does not do
+    w = w/w.sum()
+    return numpy.vstack([numpy.convolve(w, row, mode='valid')[h:h+n] for row in s])
+
+
+def _histogram_bins(t, bins):
+    """Sort the samples *t* into *bins* equally spaced bins.
+
+    The bins are defined as in
+    :func:`numkit.timeseries.regularized_function`.
+
+    :Returns: ``(edges, order, bounds)`` where *order* is the index that
+              sorts *t* (``None`` if *t* is already sorted) and the
+              sorted samples ``bounds[i]:bounds[i+1]`` fall into bin *i*
+    """
+    t = numpy.asarray(t)
+    mn, mx = float(t.min()), float(t.max())
+    if mn == mx:
+        mn -= 0.5
+        mx += 0.5
+    edges = numpy.linspace(mn, mx, bins+1, endpoint=True)
+    if numpy.all(t[1:] >= t[:-1]):
+        order = None
+        st = t
+    else:
+        order = numpy.argsort(t)
+        st = t[order]
+    bounds = numpy.r_[st.searchsorted(edges[:-1], 'left'),
+                      st.searchsorted(edges[-1], 'right')]
+    return edges, order, bounds
+
+
+def _reduceat(ufunc, y, bounds):
+    """Apply *ufunc* to the samples in each bin for all rows of *y*.
+
+    Bins are given by *bounds* (see :func:`_histogram_bins`); empty
+    bins are set to NaN.
+    """
+    counts = numpy.diff(bounds)
+    out = numpy.empty((y.shape[0], len(counts)))
+    out.fill(numpy.nan)
+    full = counts > 0
+    if numpy.any(full):
+        out[:, full] = ufunc.reduceat(y, bounds[:-1][full], axis=1)
+    return out
+
+
+def _binned_mean(y, bounds):
+    return _reduceat(numpy.add, y, bounds) / numpy.diff(bounds)
+
+def _binned_min(y, bounds):
+    return _reduceat(numpy.minimum, y, bounds)
+
+def _binned_max(y, bounds):
+    return _reduceat(numpy.maximum, y, bounds)
+
+def _binned_demean(y, bounds):
+    """Subtract the mean of each bin from its samples."""
+    return y - numpy.repeat(_binned_mean(y, bounds), numpy.diff(bounds), axis=1)
+
+def _binned_rms(y, bounds, demean=False):
+    if demean:
+        y = _binned_demean(y, bounds)
+    return numpy.sqrt(_binned_mean(y*y, bounds))
+
+def _binned_percentile(y, bounds, per=50., demean=False):
+    """Percentile *per* in each bin, as :func:`scipy.stats.scoreatpercentile`."""
+    if demean:
+        y = _binned_demean(y, bounds)
+    counts = numpy.diff(bounds)
+    # sort the samples within each bin (for all rows at once)
+    nbins, width = len(counts), max(counts.max(), 1)
+    binid = numpy.repeat(numpy.arange(nbins), counts)
+    if nbins * width <= 2 * y.shape[-1]:
+        # bins of similar size: sort a padded (rows, bins, width) array
+        pos = numpy.arange(y.shape[-1]) - numpy.repeat(bounds[:-1], counts)
+        padded = numpy.empty((y.shape[0], nbins, width))
+        padded.fill(numpy.nan)
+        padded[:, binid, pos] = y
+        padded.sort(axis=-1)
+        y = padded[:, binid, pos]
+        del padded
+    else:
+        order = numpy.lexsort((y, numpy.broadcast_to(binid, y.shape)), axis=-1)
+        y = numpy.take_along_axis(y, order, axis=-1)
+    # linear interpolation between the closest ranks
+    rank = per/100. * numpy.maximum(counts - 1, 0)
+    lower = numpy.floor(rank).astype(int)
+    fraction = rank - lower
+    upper = numpy.minimum(lower + 1, numpy.maximum(counts - 1, 0))
+    full = counts > 0
+    out = numpy.empty((y.shape[0], len(counts)))
+    out.fill(numpy.nan)
+    ylower = y[:, bounds[:-1][full] + lower[full]]
+    yupper = y[:, bounds[:-1][full] + upper[full]]
+    f = fraction[full]
+    out[:, full] = numpy.where(f > 0, ylower + (yupper - ylower)*f, ylower)
+    return out
+
+def _binned_circmean(y, bounds, low=-numpy.pi, high=numpy.pi):
+    """Circular mean in each bin, as :func:`scipy.stats.circmean`."""
+    period = high - low
+    ang = y * (2*numpy.pi/period)
+    res = numpy.arctan2(_reduceat(numpy.add, numpy.sin(ang), bounds),
+                        _reduceat(numpy.add, numpy.cos(ang), bounds))
+    return numpy.mod(res * (period/(2*numpy.pi)) - low, period) + low
+
+def _binned_error(y, bounds, dt=1.0):
+    """Error of the mean in each bin, as :func:`numkit.timeseries.tcorrel`.
+
+    The ACFs of all bins are computed with one batched FFT of the
+    zero-padded bins; the correlation time is integrated with
+    :func:`_simpson_uniform`.
+    """
+    counts = numpy.diff(bounds)
+    nbins, width = len(counts), max(counts.max(), 1)
+    y = _binned_demean(y, bounds)
+    binid = numpy.repeat(numpy.arange(nbins), counts)
+    pos = numpy.arange(y.shape[-1]) - numpy.repeat(bounds[:-1], counts)
+    padded = numpy.zeros((y.shape[0], nbins, width))
+    padded[:, binid, pos] = y
+    nfft = 2**int(numpy.ceil(numpy.log2(2*width - 1))) if width > 1 else 1
+    F = numpy.fft.rfft(padded, n=nfft, axis=-1)
+    del padded
+    lag = numpy.arange(width)
+    valid = lag < counts[:, numpy.newaxis]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        acf = numpy.fft.irfft(F.real**2 + F.imag**2, n=nfft, axis=-1)[..., :width]
+        acf /= numpy.where(valid, counts[:, numpy.newaxis] - lag, 1)
+        # first root of the ACF or, if there is none, all but the last point
+        root = (acf <= 0) & valid
+        npoints = numpy.where(root.any(axis=-1), root.argmax(axis=-1),
+                              numpy.maximum(counts - 1, 0))
+        acf0 = acf[..., 0]
+        norm = numpy.where(acf0 != 0, acf0, 1.0)
+        tc = _simpson_uniform(acf/norm[..., numpy.newaxis], npoints, dt)
+        sigma = numpy.sqrt(2*tc*acf0/((counts - 1)*dt))
+    sigma[:, counts == 0] = numpy.nan
+    return sigma
+
+#: Reductions for :meth:`XVG._decimate`, ``func(y, bounds, **kwargs)``
+_binned_reductions = {'mean': _binned_mean,
+                      'min': _binned_min,
+                      'max': _binned_max,
+                      'rms': _binned_rms,
+                      'percentile': _binned_percentile,
+                      'circmean': _binned_circmean,
+                      'error': _binned_error,
+                      }
+
+
+def _rolling_moments(y, window):
+    """Mean and variance of all windows of *window* samples in the rows of *y*.
+
+    Computed from cumulative sums of the deviations from the row means
+    (to limit round-off errors). The results for windows that contain
+    non-finite values (as for :func:`numpy.mean` and :func:`numpy.var`:
+    NaN, or +/-inf for the mean if all of them are infinite with the same
+    sign) follow from cumulative counts of NaN, +inf and -inf.
+    """
+    y = numpy.asarray(y, dtype=float)
+    m, N = y.shape
+    n = N - window + 1
+    finite = numpy.isfinite(y)
+    if window == 1:
+        return y.copy(), numpy.where(finite, 0., numpy.nan)
+    ref = numpy.where(finite, y, 0).sum(axis=1) / numpy.maximum(finite.sum(axis=1), 1)
+    d = numpy.where(finite, y - ref[:, numpy.newaxis], 0)
+    c = numpy.zeros((2, m, N + 1))
+    numpy.cumsum(d, axis=1, out=c[0, :, 1:])
+    numpy.cumsum(d*d, axis=1, out=c[1, :, 1:])
+    s = c[:, :, window:] - c[:, :, :n]
+    mean = s[0] / window
+    var = numpy.maximum(s[1] / window - mean*mean, 0)
+    mean += ref[:, numpy.newaxis]
+    if not finite.all():
+        counts = numpy.zeros((3, m, N + 1), dtype=numpy.intp)
+        for i, test in enumerate((numpy.isnan(y), numpy.isposinf(y), numpy.isneginf(y))):
+            numpy.cumsum(test, axis=1, out=counts[i, :, 1:])
+        nnan, nposinf, nneginf = counts[:, :, window:] - counts[:, :, :n]
+        mean[nposinf > 0] = numpy.inf
+        mean[nneginf > 0] = -numpy.inf
+        mean[(nnan > 0) | ((nposinf > 0) & (nneginf > 0))] = numpy.nan
+        var[(nnan > 0) | (nposinf > 0) | (nneginf > 0)] = numpy.nan
+    return mean, var
+
+def _rolling_extremum(ufunc, y, window):
+    """Running minimum or maximum (*ufunc*) of the rows of *y* (van Herk/Gil-Werman).
+
+    The rows are cut into blocks of *window* samples; the extremum of the
+    window starting at i is the extremum of the suffix of i's block and
+    the prefix of the next block up to i + *window* - 1.
+    """
+    y = numpy.asarray(y)
+    m, N = y.shape
+    n = N - window + 1
+    nblocks = -(-N // window)
+    pad = nblocks * window - N
+    if pad:
+        # padding is never part of a complete window
+        y = numpy.concatenate([y, numpy.repeat(y[:, -1:], pad, axis=1)], axis=1)
+    blocks = y.reshape(m, nblocks, window)
+    prefix = ufunc.accumulate(blocks, axis=2).reshape(m, -1)
+    suffix = ufunc.accumulate(blocks[:, :, ::-1], axis=2)[:, :, ::-1].reshape(m, -1)
+    return ufunc(suffix[:, :n], prefix[:, window-1:window-1+n])
+
+#: Moving window statistics for :meth:`XVG.rolling`, ``func(y, window)``
+_rolling_stats = {'mean': lambda y, window: _rolling_moments(y, window)[0],
+                  'var': lambda y, window: _rolling_moments(y, window)[1],
+                  'std': lambda y, window: numpy.sqrt(_rolling_moments(y, window)[1]),
+                  'min': functools.partial(_rolling_extremum, numpy.minimum),
+                  'max': functools.partial(_rolling_extremum, numpy.maximum),
+                  }
+
+
+def _binned_envelope(y, bounds):
+    """Minimum and maximum in each bin, ordered by their position in the bin.
+
+    :Returns: ``(first, second)`` where *first* is the extremum that
+              occurs first in the bin (empty bins are NaN)
+    """
+    counts = numpy.diff(bounds)
+    lo = _binned_min(y, bounds)
+    hi = _binned_max(y, bounds)
+    bins = numpy.repeat(numpy.arange(len(counts)), counts)
+    index = numpy.arange(y.shape[-1])
+    first_lo = _reduceat(numpy.minimum, numpy.where(y == lo[:, bins], index, y.shape[-1]), bounds)
+    first_hi = _reduceat(numpy.minimum, numpy.where(y == hi[:, bins], index, y.shape[-1]), bounds)
+    lo_first = first_lo <= first_hi
+    return numpy.where(lo_first, lo, hi), numpy.where(lo_first, hi, lo)
+
+def _lttb_indices(t, y, n):
+    """Indices of the *n* points selected by Largest-Triangle-Three-Buckets.
+
+    *t* is the (sorted) time and *y* the data of shape ``(M, N)``; the
+    triangle areas of all *M* rows (scaled by their range) are added.
+    The bucket averages are computed at once; only the choice of the
+    point in each bucket (which depends on the previous choice) loops
+    over the buckets.
+    """
+    N = len(t)
+    if n >= N:
+        return numpy.arange(N)
+    if n < 3:
+        return numpy.array([0, N - 1])[:n]
+    y = numpy.atleast_2d(numpy.asarray(y, dtype=float))
+    finite = numpy.isfinite(y)
+    # fmax/fmin ignore NaN (a row without finite values gives NaN)
+    scale = numpy.fmax.reduce(numpy.where(finite, y, numpy.nan), axis=1) \
+            - numpy.fmin.reduce(numpy.where(finite, y, numpy.nan), axis=1)
+    scale = numpy.where(numpy.isfinite(scale) & (scale > 0), scale, 1.)
+    y = numpy.where(finite, y, numpy.nan) / scale[:, numpy.newaxis]
+    # buckets 1 .. n-2 between the first and the last point
+    bounds = numpy.floor(numpy.linspace(1, N - 1, n - 1)).astype(int)
+    tavg = numpy.add.reduceat(t[1:N-1], bounds[:-1] - 1) / numpy.diff(bounds)
+    ysum = numpy.add.reduceat(numpy.where(finite, y, 0)[:, 1:N-1], bounds[:-1] - 1, axis=1)
+    nfinite = numpy.add.reduceat(finite[:, 1:N-1], bounds[:-1] - 1, axis=1)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        yavg = ysum / nfinite
+    # the "next bucket" of the last bucket is the last point
+    tavg = numpy.r_[tavg, t[-1]]
+    yavg = numpy.concatenate([yavg, y[:, -1:]], axis=1)
+    selected = numpy.empty(n, dtype=int)
+    selected[0], selected[-1] = 0, N - 1
+    a = 0
+    for i in range(n - 2):
+        start, stop = bounds[i], bounds[i + 1]
+        ta, ya = t[a], y[:, a:a+1]
+        tc, yc = tavg[i + 1], yavg[:, i+1:i+2]
+        area = numpy.abs((ta - tc) * (y[:, start:stop] - ya) - (ta - t[start:stop]) * (yc - ya))
+        a = start + numpy.argmax(numpy.nansum(area, axis=0))
+        selected[i + 1] = a
+    return selected
+
+def _simpson_uniform(y, npoints, dx=1.0):
+    """Integrate the first *npoints* values of *y* with Simpson's rule.
+
+    *y* is sampled with constant spacing *dx* along its last axis and
+    *npoints* (an integer array with the shape of the leading axes)
+    sets how many samples are integrated in each row. For an even
+    number of samples, the last interval is integrated with the
+    trapezoidal rule.
+    """
+    n = y.shape[-1]
+    weights = numpy.where(numpy.arange(n) % 2 == 1, 4., 2.)
+    weights[0] = 1.
+    cumulative = numpy.zeros(y.shape[:-1] + (n + 1,))
+    numpy.cumsum(numpy.nan_to_num(y) * weights, axis=-1, out=cumulative[..., 1:])
+    npoints = numpy.asarray(npoints)
+    # Simpson's rule on an odd number of points m = npoints or npoints - 1
+    m = npoints - (npoints % 2 == 0)
+    m = numpy.maximum(m, 1)
+    take = lambda a, i: numpy.take_along_axis(a, i[..., numpy.newaxis], axis=-1)[..., 0]
+    last = take(y, m - 1)
+    result = (take(cumulative, m) - last) * dx/3.
+    # trapezoidal rule for the last interval of an even number of points
+    even = (npoints % 2 == 0) & (npoints > 0)
+    i = numpy.maximum(npoints - 1, 0)
+    result = result + numpy.where(even, 0.5*dx*(take(y, numpy.maximum(i - 1, 0)) + take(y, i)), 0.)
+    return numpy.where(npoints > 0, result, 0.)
+
+
+def _gzip_compress(data):
+    """Compress the byte string *data* into a complete gzip stream."""
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as stream:
+        stream.write(data)
+    return buf.getvalue()
+
+
+def _bz2_compress(data):
+    """Compress the byte string *data* into a complete bzip2 stream."""
+    compressor = bz2.BZ2Compressor()
+    return compressor.compress(data) + compressor.flush()
+
+
+#: compression functions for :meth:`XVG.write` with *threads*, by file extension
+_compressors = {'gz': _gzip_compress, 'bz2': _bz2_compress}
+if utilities.lzma is not None:
+    _compressors['xz'] = utilities.lzma.compress
+
+
+def _format_rows(rows, fmt="%-8s"):
+    """Format the 2D array *rows* (shape ``(nrows, ncol)``) as lines of text.
+
+    All values are formatted with a single ``%`` operation; *fmt* is
+    the format for one number. Values for a ``%s`` format are converted
+    with :func:`repr` (full precision, also on Python 2).
+    """
+    nrows, ncol = rows.shape
+    line = " ".join([fmt] * ncol) + "\n"
+    values = rows.ravel().tolist()
+    if fmt.endswith('s'):
+        values = map(repr, values)
+    return (line * nrows) % tuple(values)
+
+
+def _write_threaded(filename, blocks, compress, threads):
+    """Compress the byte strings *blocks* in *threads* threads and write them to *filename*.
+
+    Each block is compressed independently with *compress* (e.g.
+    :func:`_gzip_compress`); the compressed streams are written in order.
+    """
+    pending = deque()
+    with open(filename, 'wb') as out:
+        with ThreadPoolExecutor(threads) as pool:
+            for data in blocks:
+                pending.append(pool.submit(compress, data))
+                if len(pending) > 2 * threads:
+                    out.write(pending.popleft().result())
+            while pending:
+                out.write(pending.popleft().result())
+
+
+def _parallel_task(task):
+    """Call a method of the instance in ``_parallel_xvg`` (worker of :meth:`XVG._parse_parallel`).
+
+    *task* is a tuple ``(method, args)``; bound methods cannot be
+    pickled by Python 2, so the workers use the (forked) instance.
+
+    Exceptions are returned instead of raised (see
+    :func:`_parallel_results`): a pool that is terminated while tasks
+    are still queued can deadlock.
+
+    :Returns: tuple ``(ok, result_or_exception)``
+    """
+    method, args = task
+    try:
+        return True, getattr(_parallel_xvg, method)(args)
+    except Exception as err:
+        return False, err
+
+
+def _parallel_results(results):
+    """Return the results of :func:`_parallel_task`, raising the first exception."""
+    for ok, result in results:
+        if not ok:
+            raise result
+    return [result for ok, result in results]
+
+
+def _fork_context():
+    """Return a multiprocessing context whose workers are forked (``None`` if not available)."""
+    try:
+        start_methods = multiprocessing.get_all_start_methods()
+    except AttributeError:
+        # Python 2: workers are always forked on POSIX
+        return multiprocessing if os.name == 'posix' else None
+    if 'fork' not in start_methods:
+        return None
+    return multiprocessing.get_context('fork')
+
+
+@contextmanager
+def _process_pool(nprocs, context=multiprocessing):
+    """Process pool that is joined when done and terminated after an error."""
+    pool = context.Pool(nprocs)
+    try:
+        yield pool
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+
+def _bincount_columns(y, edges, weights=None, periodic=None):
+    """Count the values of each row of *y* in the bins given by *edges*.
+
+    The bin index of each value is computed for all rows at once
+    (arithmetically for the equally spaced bins of each row, otherwise
+    with :func:`numpy.searchsorted`) and all counts are accumulated with a
+    single :func:`numpy.bincount`. Values outside the edges and NaN are
+    ignored; the last bin includes its right edge. With *periodic* =
+    ``(low, high)`` values are first wrapped into the period.
+
+    :Returns: array with the counts of all rows, shape ``(nrows * nbins,)``
+    """
+    y = numpy.ascontiguousarray(y, dtype=float)
+    if periodic is not None:
+        low, high = periodic
+        y = low + numpy.mod(y - low, high - low)
+    nrows, nbins = len(y), edges.shape[1] - 1
+    valid = (y >= edges[:, :1]) & (y <= edges[:, -1:])
+    width = edges[:, -1:] - edges[:, :1]
+    if numpy.allclose(numpy.diff(edges, axis=1), width / nbins):
+        with numpy.errstate(invalid='ignore'):
+            u = numpy.subtract(y, edges[:, :1])
+            u *= nbins / width
+        u[~valid] = 0.5
+        idx = u.astype(numpy.intp)
+        # correct for round-off for values close to an edge (as numpy.histogram)
+        u -= idx
+        near = numpy.flatnonzero((u < 1e-6) | (u > 1 - 1e-6))
+        numpy.minimum(idx, nbins - 1, out=idx)
+        if len(near) > 0:
+            i = idx.ravel()[near]
+            x = y.ravel()[near]
+            flat_edges = edges.ravel()
+            base = (near // y.shape[1]) * (nbins + 1)
+            i -= x < flat_edges[base + i]
+            i += (x >= flat_edges[base + i + 1]) & (i != nbins - 1)
+            idx.ravel()[near] = i
+    else:
+        idx = numpy.empty(y.shape, dtype=numpy.intp)
+        for i in range(nrows):    # one searchsorted per column
+            idx[i] = numpy.searchsorted(edges[i], y[i], side='right') - 1
+        numpy.clip(idx, 0, nbins - 1, out=idx)
+    idx += (numpy.arange(nrows) * nbins)[:, numpy.newaxis]
+    idx[~valid] = nrows * nbins        # extra bin for ignored values
+    w = None
+    if weights is not None:
+        w = numpy.broadcast_to(numpy.asarray(weights, dtype=float), y.shape).ravel()
+    return numpy.bincount(idx.ravel(), weights=w, minlength=nrows * nbins + 1)[:-1]
+
+
+def _bootstrap_chunk(task):
+    """Compute a chunk of moving block bootstrap replicates (see :meth:`XVG.bootstrap`).
+
+    *task* is a tuple ``(seed, nrep, block_size)``; the data and the
+    statistic are taken from the module global ``_bootstrap_args``.
+
+    :Returns: array of shape ``(ncolumns, nrep)``
+    """
+    seed, nrep, block_size = task
+    y, stat = _bootstrap_args
+    N = y.shape[-1]
+    rng = numpy.random.RandomState(seed)
+    nblocks = -(-N // block_size)
+    starts = rng.randint(0, N - block_size + 1, size=(nrep, nblocks))
+    indices = (starts[:, :, numpy.newaxis] + numpy.arange(block_size)).reshape(nrep, -1)[:, :N]
+    return stat(y[:, indices])
+
+
+def _fromstring(text, dtype=float):
+    """Convert the whitespace separated numbers in *text* to a 1D array.
+
+    Returns the values up to the first text that is not a number (numpy
+    < 2) or ``None`` if numpy raises an error for such text instead.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        try:
+            return numpy.fromstring(text, dtype=dtype, sep=' ')
+        except ValueError:
+            return None
+
+
+def _convert_prefix(lines, nfields, dtype=float):
+    """Convert the leading *lines* that consist of *nfields* numbers.
+
+    :Returns: tuple ``(values, k)``: the first *k* lines are rows of
+              *nfields* numbers and ``values[:k*nfields]`` are their
+              values
+    """
+    values = _fromstring("".join(lines), dtype)
+    if values is not None and len(values) == nfields * len(lines):
+        return values, len(lines)
+    if values is None:
+        # bisect for the longest prefix that can be converted
+        lo, hi = 0, len(lines)
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            values = _fromstring("".join(lines[:mid]), dtype)
+            if values is not None and len(values) == nfields * mid:
+                lo = mid
+            else:
+                hi = mid
+        values = _fromstring("".join(lines[:lo]), dtype) if lo > 0 else None
+        return values, lo
+    # values up to the first bad number: the lines before the line of
+    # the last value are good unless they have the wrong number of fields
+    k = min(max(len(values) - 1, 0) // nfields, len(lines))
+    for i in range(k):
+        if len(lines[i].split()) != nfields:
+            return values, i
+    return values, k
+
+
+def _read_range(filename, start, end, size=2**24):
+    """Generate the decoded text in the byte range ``[start, end)`` of *filename*.
+
+    *start* and *end* must be at line boundaries. The text is read in
+    pieces of about *size* bytes that only contain complete lines.
+    """
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        while start < end:
+            data = f.read(min(size, end - start))
+            if not data:
+                break
+            if start + len(data) < end and not data.endswith(b'\n'):
+                data += f.readline()   # complete the last line
+            start += len(data)
+            yield data.decode('utf-8', 'replace')
+
+
+class _ColumnBuffer(object):
+    """Growable array for data rows, stored with column-first indexing.
+
+    Space is allocated for *capacity* rows and doubled whenever more
+    rows need to be stored, so that appending is amortized O(1) per row.
+
+    With *inplace* = ``True`` the memory is resized with
+    :meth:`numpy.ndarray.resize` (i.e. ``realloc()``, which does not
+    copy large blocks) and the columns are moved within the buffer, so
+    that there is never a second copy of the data; :meth:`trim` then
+    returns a C-contiguous array. Views of the buffer (:attr:`array`)
+    become invalid when it grows, so this is only safe if they are not
+    kept around.
+    """
+    def __init__(self, ncol, capacity=1024, dtype=float, inplace=False):
+        self.inplace = inplace
+        self._memory = numpy.empty(ncol * capacity, dtype=dtype)
+        self.data = self._memory.reshape(ncol, capacity)
+        self.n = 0
+
+    def append(self, rows):
+        """Append *rows* (array of shape ``(nrows, ncol)``)."""
+        nrows = len(rows)
+        if self.n + nrows > self.data.shape[1]:
+            self._reserve(max(2 * self.data.shape[1], self.n + nrows))
+        self.data[:, self.n:self.n + nrows] = rows.T
+        self.n += nrows
+
+    def _reserve(self, capacity):
+        """Change the space to *capacity* (>= n) rows."""
+        ncol, old = self.data.shape
+        if capacity == old:
+            return
+        if not self.inplace:
+            data = numpy.empty((ncol, capacity), dtype=self.data.dtype)
+            data[:, :self.n] = self.data[:, :self.n]
+            self._memory, self.data = data.reshape(-1), data
+            return
+        self.data = None    # no views of the memory during resize()
+        if capacity > old:
+            self._memory.resize(ncol * capacity, refcheck=False)
+            order = range(ncol - 1, 0, -1)     # move the last column first
+        else:
+            order = range(1, ncol)
+        for i in order:
+            self._memory[i*capacity:i*capacity + self.n] = self._memory[i*old:i*old + self.n]
+        if capacity < old:
+            self._memory.resize(ncol * capacity, refcheck=False)
+        self.data = self._memory.reshape(ncol, capacity)
+
+    def trim(self):
+        """Release the unused space and return the data (shape ``(ncol, n)``)."""
+        self._reserve(self.n)
+        return self.data
+
+    @property
+    def array(self):
+        """View of the stored data with shape ``(ncol, n)``."""
+        return self.data[:, :self.n]
+
+
 def break_array(a, threshold=numpy.pi, other=None):
     """Create a array which masks jumps >= threshold.
 
@@ -1179,15 +3901,15 @@ def break_array(a, threshold=numpy.pi, other=None):
     b = numpy.empty((len(a) + m))
     # calculate new indices for breaks in b, taking previous insertions into account
     b_breaks = breaks + numpy.arange(m)
-    mask =  numpy.zeros_like(b, dtype=numpy.bool)
+    mask =  numpy.zeros_like(b, dtype=bool)
     mask[b_breaks] = True
     b[~mask] = a
-    b[mask] = numpy.NAN
+    b[mask] = numpy.nan
 
     if other is not None:
         c = numpy.empty_like(b)
         c[~mask] = other
-        c[mask] = numpy.NAN
+        c[mask] = numpy.nan
         ma_c = numpy.ma.array(c, mask=mask)
     else:
         ma_c = None
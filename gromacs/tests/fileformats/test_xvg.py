@@ -1,12 +1,19 @@
 
 
+import os
+import gzip, bz2
+
 import numpy as np
 
 import pytest
+import numkit.timeseries
 from numpy.testing import (assert_almost_equal, assert_array_equal,
                            assert_array_almost_equal, assert_equal, )
 
+import gromacs.utilities as utilities
+from gromacs.exceptions import MissingDataError
 from gromacs.formats import XVG
+from gromacs.fileformats.xvg import load_stacked, statistical_inefficiency, _ColumnBuffer
 
 
 class TestXVG_array():
@@ -31,3 +38,1197 @@ class TestXVG_array():
 
 
 
+XVG_HEADER = """# This file was created by a test
+# gmx energy
+@    title "Energies"
+@    xaxis  label "Time (ps)"
+@    yaxis  label "(kJ/mol)"
+@TYPE xy
+@ view 0.15, 0.15, 0.75, 0.85
+@ legend on
+@ s0 legend "Potential"
+@ s1 legend "Pressure"
+"""
+
+@pytest.fixture
+def data():
+    data = np.random.normal(loc=2.1, scale=0.5, size=(3, 1000))
+    data[0] = np.arange(data.shape[-1]) * 0.5
+    return data
+
+def write_xvg(filename, data, header=XVG_HEADER):
+    with open(str(filename), "w") as xvg:
+        xvg.write(header)
+        for row in data.T:
+            xvg.write(" ".join(repr(float(x)) for x in row) + "\n")
+    return str(filename)
+
+@pytest.fixture
+def xvgfile(tmpdir, data):
+    return write_xvg(tmpdir.join("energy.xvg"), data)
+
+
+class TestXVG_parse(object):
+    def test_parse(self, xvgfile, data):
+        xvg = XVG(xvgfile)
+        assert_array_equal(xvg.array, data)
+        assert_equal(xvg.names, ["Potential", "Pressure"])
+        assert_equal(xvg.xaxis, "Time (ps)")
+        assert_equal(xvg.yaxis, "(kJ/mol)")
+        assert_equal(xvg.corrupted_lineno, [])
+
+    @pytest.mark.parametrize('blocksize', [1, 7, 65536])
+    def test_blocksize(self, xvgfile, data, blocksize):
+        xvg = XVG(xvgfile)
+        xvg.parse_blocksize = blocksize
+        assert_array_equal(xvg.array, data)
+
+    @pytest.mark.parametrize('stride', [1, 3, 10])
+    def test_stride(self, xvgfile, data, stride):
+        xvg = XVG(xvgfile, stride=stride)
+        xvg.parse_blocksize = 64
+        assert_array_equal(xvg.array, data[:, ::stride])
+
+    @pytest.mark.parametrize('openfunc,ext', [(gzip.open, 'gz'), (bz2.BZ2File, 'bz2')])
+    def test_compressed(self, tmpdir, xvgfile, data, openfunc, ext):
+        filename = str(tmpdir.join("energy.xvg." + ext))
+        with open(xvgfile, "rb") as src:
+            with openfunc(filename, "wb") as dst:
+                dst.write(src.read())
+        xvg = XVG(filename)
+        xvg.parse_blocksize = 64
+        assert_array_equal(xvg.array, data)
+        assert_equal(xvg.names, ["Potential", "Pressure"])
+        assert_array_equal(XVG(filename, stride=3).array, data[:, ::3])
+
+    def test_permissive(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("corrupted.xvg"), data)
+        with open(filename, "a") as xvg:
+            xvg.write("1.0 2.0\n")
+            xvg.write("3.0 garbage 4.0\n")
+        xvg = XVG(filename, permissive=True)
+        assert_array_equal(xvg.array, data)
+        nheader = len(XVG_HEADER.splitlines())
+        assert_equal(xvg.corrupted_lineno, [nheader + data.shape[-1] + 1,
+                                            nheader + data.shape[-1] + 2])
+
+    @pytest.mark.parametrize('stride', [1, 3])
+    def test_corrupted_in_block(self, tmpdir, data, stride):
+        bad = {100: "3.0 garbage 4.0\n", 101: "1.0 2.0\n", 500: "1.0 2.0 3.0 4.0\n",
+               600: "1.0 2.0 3.0x\n"}
+        lines = []     # (row of data or None for a bad line, text)
+        for i, row in enumerate(data.T):
+            if i in bad:
+                lines.append((None, bad[i]))
+            lines.append((i, " ".join(repr(float(x)) for x in row) + "\n"))
+        filename = str(tmpdir.join("corrupted.xvg"))
+        with open(filename, "w") as xvg:
+            xvg.write(XVG_HEADER)
+            xvg.write("".join(text for i, text in lines))
+        x = XVG(filename, permissive=True, stride=stride)
+        x.parse_blocksize = 1000
+        assert_array_equal(x.array, data[:, [i for i, text in lines[::stride] if i is not None]])
+        nheader = len(XVG_HEADER.splitlines())
+        assert_equal(x.corrupted_lineno, [nheader + k + 1 for k, (i, text) in enumerate(lines)
+                                          if i is None and k % stride == 0])
+
+    def test_corrupted_line_only(self, tmpdir, data, monkeypatch):
+        filename = write_xvg(tmpdir.join("corrupted.xvg"), data[:, :500])
+        with open(filename, "a") as xvg:
+            xvg.write("3.0 garbage 4.0\n")
+        write_xvg(filename + ".tail", data[:, 500:], header="")
+        with open(filename, "a") as xvg, open(filename + ".tail") as tail:
+            xvg.write(tail.read())
+        calls = []
+        parse_lines = XVG._parse_lines
+        def spy(self, lines, *args, **kwargs):
+            calls.append(len(lines))
+            return parse_lines(self, lines, *args, **kwargs)
+        monkeypatch.setattr(XVG, "_parse_lines", spy)
+        x = XVG(filename, permissive=True)
+        assert_array_equal(x.array, data)
+        # the header and the bad line
+        assert_equal(calls, [len(XVG_HEADER.splitlines()), 1])
+
+    def test_convert_prefix(self, monkeypatch):
+        import gromacs.fileformats.xvg as xvgmodule
+        lines = ["1 2\n", "3 4\n", "5 x\n", "7 8\n"]
+        values, k = xvgmodule._convert_prefix(lines, 2)
+        assert_equal(k, 2)
+        assert_array_equal(values[:4], [1, 2, 3, 4])
+
+        def fromstring(text, dtype=float):
+            # numpy >= 2 raises for text that is not a number
+            values = np.array(text.split(), dtype=object)
+            try:
+                return values.astype(dtype)
+            except ValueError:
+                return None
+        monkeypatch.setattr(xvgmodule, "_fromstring", fromstring)
+        values, k = xvgmodule._convert_prefix(lines, 2)
+        assert_equal(k, 2)
+        assert_array_equal(values[:4], [1, 2, 3, 4])
+        assert_equal(xvgmodule._convert_prefix(["1 2 3\n"] + lines, 2)[1], 0)
+
+    def test_not_permissive(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("corrupted.xvg"), data)
+        with open(filename, "a") as xvg:
+            xvg.write("1.0 2.0\n")
+        xvg = XVG(filename)
+        with pytest.raises(IOError):
+            xvg.parse()
+
+
+class TestXVG_cache(object):
+    @pytest.mark.parametrize('cachedir', [None, "cache"])
+    def test_cache(self, tmpdir, xvgfile, data, cachedir):
+        cache = True if cachedir is None else str(tmpdir.join(cachedir))
+        xvg = XVG(xvgfile, cache=cache)
+        assert_array_equal(xvg.array, data)
+        npy, meta = xvg._cache_filenames()
+        assert os.path.exists(npy)
+        assert os.path.exists(meta)
+
+        cached = XVG(xvgfile, cache=cache)
+        assert isinstance(cached.array, np.memmap)
+        assert_array_equal(cached.array, data)
+        assert_equal(cached.names, ["Potential", "Pressure"])
+        assert_equal(cached.xaxis, "Time (ps)")
+
+    def test_invalidate(self, tmpdir, xvgfile, data):
+        XVG(xvgfile, cache=True).parse()
+        assert XVG(xvgfile, cache=True, stride=2).array.shape[-1] == data.shape[-1] // 2
+
+        write_xvg(xvgfile, data[:, :10])
+        os.utime(xvgfile, (0, 0))
+        xvg = XVG(xvgfile, cache=True)
+        assert_array_equal(xvg.array, data[:, :10])
+
+    def test_permissive(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("corrupted.xvg"), data)
+        with open(filename, "a") as xvg:
+            xvg.write("3.0 garbage 4.0\n")
+        assert_array_equal(XVG(filename, cache=True, permissive=True).array, data)
+        with pytest.raises(ValueError):
+            XVG(filename, cache=True).parse()
+
+
+class TestXVG_iterchunks(object):
+    @pytest.mark.parametrize('nrows', [1, 64, 999, 5000])
+    def test_iterchunks(self, xvgfile, data, nrows):
+        xvg = XVG(xvgfile)
+        xvg.parse_blocksize = 100
+        chunks = [chunk.copy() for chunk in xvg.iterchunks(nrows=nrows)]
+        assert all(chunk.shape[-1] == nrows for chunk in chunks[:-1])
+        assert_array_equal(np.hstack(chunks), data)
+
+    def test_columns_stride(self, xvgfile, data):
+        xvg = XVG(xvgfile, stride=3)
+        xvg.parse_blocksize = 100
+        chunks = [chunk.copy() for chunk in xvg.iterchunks(nrows=64, columns=[0, 2])]
+        assert_array_equal(np.hstack(chunks), data[[0, 2], ::3])
+
+    def test_buffer_reused(self, xvgfile):
+        xvg = XVG(xvgfile)
+        chunks = list(xvg.iterchunks(nrows=100))
+        assert len(set(id(chunk) for chunk in chunks)) == 1
+
+    def test_header_once(self, xvgfile):
+        xvg = XVG(xvgfile)
+        for i in range(2):
+            for chunk in xvg.iterchunks(nrows=100):
+                pass
+        assert_equal(xvg.names, ["Potential", "Pressure"])
+
+    def test_array(self, data):
+        xvg = XVG(array=data)
+        chunks = list(xvg.iterchunks(nrows=300, columns=[1]))
+        assert_equal(len(chunks), 4)
+        assert_array_equal(np.hstack(chunks), data[[1]])
+
+
+class TestXVG_refresh(object):
+    @staticmethod
+    def append(filename, data, partial=""):
+        with open(filename, "a") as xvg:
+            for row in data.T:
+                xvg.write(" ".join(repr(float(x)) for x in row) + "\n")
+            xvg.write(partial)
+
+    def test_refresh(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("running.xvg"), data[:, :100])
+        xvg = XVG(filename)
+        assert_equal(xvg.refresh(), 100)
+        assert_array_equal(xvg.array, data[:, :100])
+
+        self.append(filename, data[:, 100:500], partial="500.0 1.")
+        assert_equal(xvg.refresh(), 400)
+        assert_array_equal(xvg.array, data[:, :500])
+        assert_equal(xvg.refresh(), 0)
+
+        with open(filename, "a") as f:
+            f.write("5 2.0\n")
+        self.append(filename, data[:, 501:])
+        assert_equal(xvg.refresh(), data.shape[-1] - 500)
+        assert_array_equal(xvg.array[:, 501:], data[:, 501:])
+        assert_array_equal(xvg.array[:, 500], [500.0, 1.5, 2.0])
+        assert_equal(xvg.names, ["Potential", "Pressure"])
+
+    def test_final(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("running.xvg"), data[:, :10])
+        with open(filename, "a") as f:
+            f.write("10.0 1.0 2.0")
+        xvg = XVG(filename)
+        assert_equal(xvg.refresh(), 10)
+        assert_equal(xvg.refresh(final=True), 1)
+        assert_array_equal(xvg.array[:, -1], [10.0, 1.0, 2.0])
+
+    def test_truncated(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("running.xvg"), data[:, :100])
+        xvg = XVG(filename)
+        xvg.refresh()
+        write_xvg(filename, data[:, :10])
+        assert_equal(xvg.refresh(), 10)
+        assert_array_equal(xvg.array, data[:, :10])
+
+    def test_compressed(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("running.xvg"), data[:, :10])
+        with open(filename, "rb") as src, gzip.open(filename + ".gz", "wb") as dst:
+            dst.write(src.read())
+        xvg = XVG(filename + ".gz")
+        with pytest.raises(ValueError):
+            xvg.refresh()
+
+    def test_truncated_header_only(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("running.xvg"), data[:, :100])
+        xvg = XVG(filename)
+        xvg.refresh()
+        xvg.mean
+        write_xvg(filename, data[:, :0])
+        assert_equal(xvg.refresh(), 0)
+        assert_equal(xvg.array.size, 0)
+        self.append(filename, data[:, :10])
+        assert_equal(xvg.refresh(), 10)
+        assert_array_almost_equal(xvg.mean, data[1:, :10].mean(axis=1))
+
+
+class TestXVG_streaming(object):
+    def test_stats(self, xvgfile, data):
+        xvg = XVG(xvgfile, streaming=True)
+        xvg.parse_blocksize = 64
+        assert_array_almost_equal(xvg.mean, data[1:].mean(axis=1))
+        assert_array_almost_equal(xvg.std, data[1:].std(axis=1))
+        assert_array_equal(xvg.min, data[1:].min(axis=1))
+        assert_array_equal(xvg.max, data[1:].max(axis=1))
+        # statistics were computed without loading the data
+        assert xvg._XVG__array is None
+
+    def test_array_after_stats(self, xvgfile, data):
+        xvg = XVG(xvgfile, streaming=True)
+        xvg.mean
+        assert_array_almost_equal(xvg.array, data)
+        # header is not parsed a second time
+        reference = XVG(xvgfile)
+        reference.parse()
+        assert xvg.names == reference.names == ["Potential", "Pressure"]
+        assert xvg.metadata['legend'] == reference.metadata['legend']
+
+
+class TestXVG_correl(object):
+    def setup_method(self):
+        t = np.arange(5000) * 0.1
+        noise = np.random.RandomState(42).normal(size=(3, len(t)))
+        # correlated noise with different correlation times
+        for i, w in enumerate([1, 10, 50]):
+            noise[i] = np.convolve(noise[i], np.ones(w)/w, mode="same")
+        self.data = np.vstack((t, noise))
+        self.x = XVG(array=self.data)
+
+    def test_autocorrelation_fft(self):
+        from gromacs.fileformats.xvg import autocorrelation_fft
+        acf = autocorrelation_fft(self.data[1:])
+        for y, a in zip(self.data[1:], acf):
+            assert_array_almost_equal(a, numkit.timeseries.autocorrelation_fft(y))
+
+    def test_tc_error(self):
+        nstep = 2
+        t = self.data[0, ::nstep]
+        reference = [numkit.timeseries.tcorrel(t, y, nstep=1)
+                     for y in self.data[1:, ::nstep]]
+        self.x.set_correlparameters(nstep=nstep)
+        assert_array_almost_equal(self.x.tc, [r['tc'] for r in reference])
+        assert_array_almost_equal(self.x.error, [r['sigma'] for r in reference])
+
+    def test_columns(self):
+        self.x.set_correlparameters(nstep=1)
+        tc = self.x.tc
+        self.x.set_correlparameters(columns=[2, 3])
+        assert_array_almost_equal(self.x.tc, tc[1:])
+
+
+class TestXVG_decimate(object):
+    def setup_method(self):
+        rs = np.random.RandomState(1)
+        t = np.sort(rs.uniform(0, 100, 5003))
+        self.data = np.vstack((t, rs.normal(size=(3, len(t)))))
+        self.x = XVG(array=self.data)
+
+    @pytest.mark.parametrize('method,func,kwargs', [
+        ('mean', numkit.timeseries.mean_histogrammed_function, {}),
+        ('min', numkit.timeseries.min_histogrammed_function, {}),
+        ('max', numkit.timeseries.max_histogrammed_function, {}),
+        ('rms', numkit.timeseries.rms_histogrammed_function, {}),
+        ('rms', numkit.timeseries.rms_histogrammed_function, {'demean': True}),
+        ('percentile', numkit.timeseries.percentile_histogrammed_function, {'per': 95}),
+        ('percentile', numkit.timeseries.percentile_histogrammed_function,
+         {'per': 50, 'demean': True}),
+    ])
+    @pytest.mark.parametrize('maxpoints', [100, 2000])
+    def test_histogrammed(self, method, func, kwargs, maxpoints):
+        out = self.x.decimate(method, self.data, maxpoints=maxpoints, **kwargs)
+        assert_equal(out.shape, (4, maxpoints))
+        for y, column in zip(self.data[1:], out[1:]):
+            F, t = func(self.data[0], y.copy(), bins=maxpoints, **kwargs)
+            assert_array_almost_equal(column, F)
+        assert_array_almost_equal(out[0], t)
+
+    def test_circmean(self):
+        angles = np.random.RandomState(2).uniform(-np.pi, np.pi, size=self.data.shape[-1])
+        a = np.vstack((self.data[0], angles))
+        out = self.x._decimate("circmean", a, 500)
+        F, t = numkit.timeseries.circmean_histogrammed_function(a[0], a[1], bins=500)
+        assert_array_almost_equal(out[1], F)
+
+    @pytest.mark.parametrize('window', ['flat', 'hanning'])
+    def test_smooth(self, window):
+        from gromacs.fileformats.xvg import smooth
+        smoothed = smooth(self.data[1:], 11, window=window)
+        for y, s in zip(self.data[1:], smoothed):
+            assert_array_almost_equal(s, numkit.timeseries.smooth(y, 11, window=window))
+
+
+class TestXVG_stride(object):
+    @pytest.mark.parametrize('stride', [2, 7, 100])
+    @pytest.mark.parametrize('blocksize', [5, 64, 65536])
+    def test_stride(self, xvgfile, data, stride, blocksize):
+        xvg = XVG(xvgfile, stride=stride)
+        xvg.parse_blocksize = blocksize
+        assert_array_equal(xvg.array, data[:, ::stride])
+        assert_equal(xvg.names, ["Potential", "Pressure"])
+
+    def test_blank_lines(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("blank.xvg"), data[:, :10])
+        with open(filename, "a") as f:
+            f.write("\n   \n")
+        with open(filename, "a") as f:
+            for row in data[:, 10:20].T:
+                f.write(" ".join(repr(float(x)) for x in row) + "\n\n")
+        xvg = XVG(filename, stride=3)
+        assert_array_equal(xvg.array, data[:, :20:3])
+
+    def test_discarded_lines_not_converted(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("corrupted.xvg"), data[:, :8])
+        with open(filename, "a") as f:
+            f.write("garbage\n")
+        xvg = XVG(filename, stride=3)
+        assert_array_equal(xvg.array, data[:, :8:3])
+        assert_equal(xvg.corrupted_lineno, [])
+
+
+class TestXVG_nprocs(object):
+    @pytest.fixture
+    def corrupted(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("corrupted.xvg"), data)
+        with open(filename) as f:
+            lines = f.readlines()
+        nhead = len(lines) - data.shape[1]
+        lines[nhead + 100] = "garbage\n"
+        lines[nhead + 501] = "1.0 2.0\n"
+        lines.insert(nhead + 700, "# comment in the middle\n\n")
+        with open(filename, "w") as f:
+            f.writelines(lines)
+        return filename
+
+    @pytest.mark.parametrize('stride', [1, 3, 7])
+    @pytest.mark.parametrize('nprocs', [2, 5])
+    def test_parallel(self, xvgfile, data, nprocs, stride):
+        xvg = XVG(xvgfile, nprocs=nprocs, stride=stride)
+        xvg.parallel_minsize = 0
+        assert_array_equal(xvg.array, data[:, ::stride])
+        assert xvg.array.flags['C_CONTIGUOUS']
+        assert_equal(xvg.names, ["Potential", "Pressure"])
+        assert_equal(xvg.xaxis, "Time (ps)")
+
+    @pytest.mark.parametrize('stride', [1, 3])
+    def test_permissive(self, corrupted, stride):
+        serial = XVG(corrupted, permissive=True, stride=stride)
+        xvg = XVG(corrupted, permissive=True, stride=stride, nprocs=4)
+        xvg.parallel_minsize = 0
+        assert_array_equal(xvg.array, serial.array)
+        assert_equal(xvg.corrupted_lineno, serial.corrupted_lineno)
+
+    def test_not_permissive(self, corrupted):
+        xvg = XVG(corrupted, nprocs=4)
+        xvg.parallel_minsize = 0
+        with pytest.raises(ValueError):
+            xvg.parse()
+
+    def test_small_file_serial(self, xvgfile, data):
+        xvg = XVG(xvgfile, nprocs=4)
+        assert not xvg._parallel_ok()
+        assert_array_equal(xvg.array, data)
+
+
+class TestXVG_write(object):
+    @pytest.fixture
+    def xvg(self, data):
+        return XVG(array=data, names="Potential,Pressure")
+
+    def test_roundtrip(self, tmpdir, xvg, data):
+        filename = str(tmpdir.join("out.xvg"))
+        xvg.write_blocksize = 64
+        xvg.write(filename)
+        x = XVG(filename)
+        assert_array_equal(x.array, data)
+        assert_equal(x.names, ["Potential", "Pressure"])
+
+    def test_names_with_x(self, tmpdir, data):
+        filename = str(tmpdir.join("out.xvg"))
+        XVG(array=data, names="t,Potential,Pressure").write(filename)
+        x = XVG(filename)
+        x.parse()
+        assert_equal(x.names, ["Potential", "Pressure"])
+
+    def test_fmt(self, tmpdir, xvg, data):
+        filename = str(tmpdir.join("out.xvg"))
+        xvg.write(filename, fmt="%.3f")
+        assert_array_almost_equal(XVG(filename).array, data, decimal=3)
+
+    @pytest.mark.parametrize('ext', ['gz', 'bz2', 'xz'])
+    @pytest.mark.parametrize('threads', [None, 3])
+    def test_compressed(self, tmpdir, xvg, ext, threads):
+        if ext == 'xz' and utilities.lzma is None:
+            pytest.skip("xz compression requires lzma")
+        filename = str(tmpdir.join("out.xvg." + ext))
+        xvg.write_blocksize = 100
+        xvg.write(filename, threads=threads)
+        plain = str(tmpdir.join("out.xvg"))
+        xvg.write(plain)
+        with utilities.openany(filename, "rb") as f:
+            text = f.read()
+        with open(plain, "rb") as f:
+            assert_equal(text, f.read())
+
+    @pytest.mark.parametrize('ext', ['gz', 'bz2', 'xz'])
+    @pytest.mark.parametrize('threads', [None, 3])
+    def test_compressed_roundtrip(self, tmpdir, xvg, data, ext, threads):
+        if ext == 'xz' and utilities.lzma is None:
+            pytest.skip("xz compression requires lzma")
+        filename = str(tmpdir.join("out.xvg." + ext))
+        xvg.write_blocksize = 100
+        xvg.write(filename, threads=threads)
+        x = XVG(filename)
+        assert_array_almost_equal(x.array, data)
+        assert_equal(x.names, ["Potential", "Pressure"])
+
+    def test_xz_without_lzma(self, tmpdir, xvg, monkeypatch):
+        monkeypatch.setattr(utilities, "lzma", None)
+        filename = tmpdir.join("out.xvg.xz")
+        with pytest.raises(ValueError):
+            xvg.write(str(filename))
+        assert not filename.check()
+
+
+class TestXVG_usecols(object):
+    @pytest.mark.parametrize('usecols', [[0, 2], [2, 0], [0], [1]])
+    def test_usecols(self, xvgfile, data, usecols):
+        xvg = XVG(xvgfile, usecols=usecols)
+        cols = sorted(usecols)
+        assert_array_equal(xvg.array, data[cols])
+        assert_equal(xvg.names, [["Potential", "Pressure"][c - 1] for c in cols if c > 0])
+
+    def test_float32(self, xvgfile, data):
+        xvg = XVG(xvgfile, dtype=np.float32, usecols=[0, 1])
+        assert_equal(xvg.array.dtype, np.float32)
+        assert_array_equal(xvg.array, data[:2].astype(np.float32))
+
+    def test_unselected_not_converted(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("junk.xvg"), data[:, :10])
+        with open(filename, "a") as f:
+            f.write("5.0 garbage 7.0\n")
+        xvg = XVG(filename, usecols=[0, 2])
+        assert_array_equal(xvg.array[:, :10], data[::2, :10])
+        assert_array_equal(xvg.array[:, 10], [5.0, 7.0])
+
+    def test_missing_column(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("short.xvg"), data[:, :10])
+        with open(filename, "a") as f:
+            f.write("5.0 6.0\n")
+        xvg = XVG(filename, usecols=[0, 2], permissive=True)
+        assert_array_equal(xvg.array, data[::2, :10])
+        assert_equal(len(xvg.corrupted_lineno), 1)
+
+    def test_missing_column_strict(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("short.xvg"), data[:, :10])
+        with open(filename, "a") as f:
+            f.write("5.0 6.0\n")
+        with pytest.raises(IOError):
+            XVG(filename, usecols=[0, 2]).parse()
+
+    def test_parallel(self, xvgfile, data):
+        xvg = XVG(xvgfile, dtype=np.float32, usecols=[0, 2], nprocs=3)
+        xvg.parallel_minsize = 0
+        assert_equal(xvg.array.dtype, np.float32)
+        assert_array_equal(xvg.array, data[::2].astype(np.float32))
+
+    def test_cache(self, xvgfile, data):
+        XVG(xvgfile, cache=True).parse()
+        xvg = XVG(xvgfile, cache=True, usecols=[0, 1])
+        assert_array_equal(xvg.array, data[:2])
+        assert_equal(xvg.names, ["Potential"])
+
+
+class TestXVG_read_window(object):
+    @staticmethod
+    def window(data, tmin, tmax):
+        return data[:, (data[0] >= tmin) & (data[0] <= tmax)]
+
+    @pytest.mark.parametrize('tmin,tmax', [(100, 200), (0, 10), (-5, 3.2),
+                                           (480, 1000), (123.4, 123.4), (600, 700)])
+    def test_window(self, xvgfile, data, tmin, tmax):
+        xvg = XVG(xvgfile)
+        xvg.index_interval = 37
+        assert_array_equal(xvg.read_window(tmin, tmax), self.window(data, tmin, tmax))
+
+    def test_open_ends(self, xvgfile, data):
+        xvg = XVG(xvgfile)
+        assert_array_equal(xvg.read_window(tmax=20), self.window(data, 0, 20))
+        assert_array_equal(xvg.read_window(tmin=490), self.window(data, 490, 500))
+
+    def test_loaded(self, xvgfile, data):
+        xvg = XVG(xvgfile)
+        xvg.parse()
+        assert_array_equal(xvg.read_window(10, 20), self.window(data, 10, 20))
+
+    def test_stride_usecols(self, xvgfile, data):
+        xvg = XVG(xvgfile, stride=3, usecols=[0, 2])
+        xvg.index_interval = 50
+        assert_array_equal(xvg.read_window(100, 200), self.window(data, 100, 200)[::2, ::3])
+
+    def test_index_persisted(self, xvgfile, data):
+        xvg = XVG(xvgfile)
+        xvg.index_interval = 100
+        times, offsets, linenos = xvg.build_index()
+        assert os.path.exists(xvgfile + ".idx.npz")
+        # every 100th line of the file (including the header)
+        nhead = len(XVG_HEADER.splitlines())
+        assert_array_equal(times[1:], data[0, 100 - nhead::100])
+        assert_array_equal(linenos[1:], np.arange(100, 1000 + nhead, 100))
+        with open(xvgfile, "rb") as f:
+            f.seek(offsets[3])
+            assert_almost_equal(float(f.readline().split()[0]), times[3])
+        other = XVG(xvgfile)
+        other.index_interval = 100
+        assert_array_equal(other.build_index()[1], offsets)
+
+    def test_index_invalidated(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("grow.xvg"), data[:, :500])
+        XVG(filename).build_index()
+        write_xvg(filename, data)
+        os.utime(filename, (0, 0))
+        assert_array_equal(XVG(filename).read_window(400, 500), self.window(data, 400, 500))
+
+    def test_not_monotonic(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("restart.xvg"), np.hstack([data, data]))
+        xvg = XVG(filename)
+        xvg.index_interval = 100
+        with pytest.raises(ValueError):
+            xvg.read_window(10, 20)
+
+
+class TestXVG_load_stacked(object):
+    @pytest.fixture
+    def replicas(self, tmpdir, data):
+        arrays = [data + i * np.array([[0], [1], [2]]) for i in range(4)]
+        files = [write_xvg(tmpdir.join("rep{0}.xvg".format(i)), a) for i, a in enumerate(arrays)]
+        return files, np.array(arrays)
+
+    @pytest.mark.parametrize('nprocs', [1, 3])
+    def test_stacked(self, replicas, nprocs):
+        files, arrays = replicas
+        a, names = load_stacked(files, nprocs=nprocs)
+        assert_equal(a.shape, (4, 3, 1000))
+        assert_array_equal(a, arrays)
+        assert_equal(names, ["Potential", "Pressure"])
+
+    def test_kwargs(self, replicas):
+        files, arrays = replicas
+        a, names = load_stacked(files, nprocs=2, stride=10, usecols=[0, 2], dtype=np.float32)
+        assert_equal(a.dtype, np.float32)
+        assert_array_equal(a, arrays[:, ::2, ::10].astype(np.float32))
+        assert_equal(names, ["Pressure"])
+
+    def test_time_mismatch(self, replicas, tmpdir, data):
+        files, arrays = replicas
+        shifted = data.copy()
+        shifted[0] += 0.1
+        files.append(write_xvg(tmpdir.join("shifted.xvg"), shifted))
+        with pytest.raises(ValueError):
+            load_stacked(files, nprocs=2)
+
+    def test_length_mismatch(self, replicas, tmpdir, data):
+        files, arrays = replicas
+        files.append(write_xvg(tmpdir.join("short.xvg"), data[:, :500]))
+        with pytest.raises(ValueError):
+            load_stacked(files, nprocs=1)
+
+
+class TestXVG_merge(object):
+    @pytest.fixture
+    def parts(self, tmpdir, data):
+        # part 2 restarts at row 300 (overlap 300-399), part 3 at row 700
+        segments = [data[:, :400], data[:, 300:750].copy(), data[:, 700:]]
+        segments[1][1:] += 10   # distinguish the data of the later segment
+        files = [write_xvg(tmpdir.join("md.part{0:04d}.xvg".format(i + 1)), a)
+                 for i, a in enumerate(segments)]
+        expected = np.hstack([data[:, :300], segments[1][:, :400], data[:, 700:]])
+        return str(tmpdir.join("md")), files, expected
+
+    def test_merge_files(self, parts):
+        prefix, files, expected = parts
+        xvg = XVG.merge(files)
+        assert_array_equal(xvg.array, expected)
+        assert_equal(xvg.names, ["Potential", "Pressure"])
+
+    def test_restart_before_previous(self, tmpdir, data):
+        # part 3 restarts (at row 400) before part 2 (rows 500-999) ended
+        segments = [data[:, :501], data[:, 500:].copy(), data[:, 400:].copy()]
+        segments[1][1:] += 10
+        segments[2][1:] += 20
+        files = [write_xvg(tmpdir.join("md.part{0:04d}.xvg".format(i + 1)), a)
+                 for i, a in enumerate(segments)]
+        assert_array_equal(XVG.merge(files).array,
+                           np.hstack([data[:, :400], segments[2]]))
+
+    def test_prefix_order(self, tmpdir, data):
+        # PREFIX.xvg is the first part
+        write_xvg(tmpdir.join("md.xvg"), data[:, :600])
+        write_xvg(tmpdir.join("md.part0002.xvg"), data[:, 500:])
+        assert_array_equal(XVG.merge(str(tmpdir.join("md"))).array, data)
+        assert_array_equal(XVG.merge(u"{0!s}".format(tmpdir.join("md"))).array, data)
+
+    def test_merge_prefix(self, parts, tmpdir):
+        prefix, files, expected = parts
+        filename = str(tmpdir.join("merged.xvg"))
+        XVG.merge(prefix, filename=filename)
+        assert_array_equal(XVG(filename).array, expected)
+
+    def test_same_start(self, tmpdir, data):
+        files = [write_xvg(tmpdir.join("a.xvg"), data[:, :500]),
+                 write_xvg(tmpdir.join("b.xvg"), data)]
+        assert_array_equal(XVG.merge(files).array, data)
+
+    def test_columns_differ(self, tmpdir, data):
+        files = [write_xvg(tmpdir.join("a.xvg"), data[:, :500]),
+                 write_xvg(tmpdir.join("b.xvg"), data[:2, 500:])]
+        with pytest.raises(ValueError):
+            XVG.merge(files)
+
+
+class TestXVG_blocking(object):
+    def setup_method(self):
+        rng = np.random.RandomState(2017)
+        N = 2**15
+        # AR(1) processes: error of the mean known analytically
+        self.phi = np.array([0., 0.5, 0.9])
+        noise = rng.normal(size=(3, N))
+        y = np.empty_like(noise)
+        y[:, 0] = noise[:, 0]
+        for i in range(1, N):
+            y[:, i] = self.phi * y[:, i-1] + noise[:, i]
+        self.x = XVG(array=np.vstack([np.arange(N), y]))
+        self.y = y
+
+    def test_levels(self):
+        blocksize, error, error_error = self.x.block_average()
+        assert_array_equal(blocksize, 2**np.arange(15))
+        # reference: blocking transformation for a single column
+        y = self.y[2]
+        for level in range(len(blocksize)):
+            assert_almost_equal(error[level, 2], np.sqrt(y.var() / (len(y) - 1)))
+            n = len(y) // 2
+            y = 0.5 * (y[0:2*n:2] + y[1:2*n:2])
+
+    def test_cached(self):
+        assert self.x.block_average() is self.x.block_average()
+
+    def test_plateau(self):
+        N = self.y.shape[1]
+        expected = np.sqrt((1 + self.phi) / (1 - self.phi) / (1 - self.phi**2) / N)
+        assert_array_almost_equal(self.x.error_blocking / expected, np.ones(3), decimal=1)
+
+    @pytest.mark.parametrize('n', [0, 1])
+    def test_too_few_points(self, n):
+        x = XVG(array=np.ones((3, n)))
+        with pytest.raises(MissingDataError):
+            x.block_average()
+
+
+class TestXVG_bootstrap(object):
+    def setup_method(self):
+        rng = np.random.RandomState(16)
+        N = 5000
+        self.y = rng.normal(loc=[[1.], [-2.]], scale=[[1.], [3.]], size=(2, N))
+        self.x = XVG(array=np.vstack([np.arange(N), self.y]))
+
+    def test_mean(self):
+        value, low, high = self.x.bootstrap(nboot=400, seed=42)
+        assert_array_almost_equal(value, self.y.mean(axis=1))
+        assert np.all(low < value) and np.all(value < high)
+        halfwidth = 1.96 * self.y.std(axis=1) / np.sqrt(self.y.shape[1])
+        assert_array_almost_equal((high - low) / (2 * halfwidth), np.ones(2), decimal=1)
+
+    def test_deterministic(self):
+        a = self.x.bootstrap(nboot=250, seed=1, block_size=10)
+        b = self.x.bootstrap(nboot=250, seed=1, block_size=10, nprocs=3)
+        assert_array_equal(a, b)
+
+    def test_stat_name(self):
+        value, low, high = self.x.bootstrap(u"median", nboot=50, seed=3)
+        assert_array_almost_equal(value, np.median(self.y, axis=1))
+        assert np.all(low <= value) and np.all(value <= high)
+
+    def test_stat_callable(self):
+        value, low, high = self.x.bootstrap(lambda x: np.percentile(x, 90, axis=-1),
+                                            nboot=50, seed=2, nprocs=2)
+        assert_array_almost_equal(value, np.percentile(self.y, 90, axis=1))
+        assert np.all(low <= high)
+
+
+class TestXVG_equilibration(object):
+    def setup_method(self):
+        rng = np.random.RandomState(17)
+        N = 20000
+        t = np.arange(N) * 2.0
+        noise = rng.normal(size=(2, N))
+        for i in range(1, N):
+            noise[:, i] += 0.8 * noise[:, i-1]
+        # column 2 starts far from equilibrium and relaxes with tau = 2000 ps
+        y = noise + np.array([[0.], [30.]]) * np.exp(-t / 2000.)
+        self.x = XVG(array=np.vstack([t, y]))
+        self.noise = noise
+
+    @staticmethod
+    def naive_g(y, mintime=3):
+        N = len(y)
+        dy = y - y.mean()
+        g = 1.
+        for t in range(1, N):
+            C = np.dot(dy[:N-t], dy[t:]) / (N - t) / dy.var()
+            if C <= 0 and t >= mintime:
+                break
+            g += 2 * (1 - t / float(N)) * C
+        return max(g, 1.)
+
+    def test_statistical_inefficiency(self):
+        y = self.noise[:, :2000]
+        assert_array_almost_equal(statistical_inefficiency(y),
+                                  [self.naive_g(row) for row in y])
+        assert_equal(statistical_inefficiency(np.ones((1, 100))), [1.])
+
+    def test_detect_equilibration(self):
+        t0, g, neff = self.x.detect_equilibration(full=True)
+        assert t0[0] < 1000
+        assert 4000 < t0[1] < 20000
+        assert_array_almost_equal(neff, (self.x.array.shape[1] - t0 / 2.0) / g)
+        assert_array_equal(self.x.detect_equilibration(columns=[2]), t0[1:])
+
+
+class TestXVG_histogram(object):
+    def test_histogram(self, xvgfile, data):
+        counts, edges = XVG(xvgfile).histogram(bins=20)
+        assert_equal(counts.shape, (2, 20))
+        for i, y in enumerate(data[1:]):
+            ref, ref_edges = np.histogram(y, bins=20)
+            assert_array_equal(counts[i], ref)
+            assert_array_almost_equal(edges[i], ref_edges)
+
+    def test_range_edges(self, xvgfile, data):
+        xvg = XVG(xvgfile)
+        counts, edges = xvg.histogram(columns=[1, 2], bins=10, range=[(1, 3), (0, 4)])
+        assert_array_equal(counts[1], np.histogram(data[2], bins=10, range=(0, 4))[0])
+        bins = [0., 1., 1.5, 2., 2.2, 5.]
+        counts, edges = xvg.histogram(bins=bins)
+        assert_array_equal(counts[0], np.histogram(data[1], bins=bins)[0])
+
+    def test_weights(self, xvgfile, data):
+        xvg = XVG(xvgfile)
+        w = np.linspace(0, 1, data.shape[1])
+        counts, edges = xvg.histogram(columns=[1], bins=10, range=(0, 4), weights=w)
+        assert_array_almost_equal(counts[0], np.histogram(data[1], bins=10, range=(0, 4), weights=w)[0])
+        counts, edges = xvg.histogram(columns=[1], bins=10, range=(0, 4), weights=2)
+        assert_array_almost_equal(counts[0],
+                                  np.histogram(data[1], bins=10, range=(0, 4), weights=data[2])[0])
+
+    def test_density(self, xvgfile):
+        counts, edges = XVG(xvgfile).histogram(bins=15, density=True)
+        assert_array_almost_equal((counts * np.diff(edges, axis=1)).sum(axis=1), [1, 1])
+
+    def test_periodic(self):
+        phi = np.array([-179., 179., 181., -181., 0., 540.])
+        x = XVG(array=np.vstack([np.arange(len(phi)), phi]))
+        counts, edges = x.histogram(bins=4, periodic=(-180, 180))
+        assert_array_equal(edges[0], [-180, -90, 0, 90, 180])
+        assert_array_equal(counts[0], [3, 0, 1, 2])
+
+    def test_streaming(self, xvgfile):
+        xvg = XVG(xvgfile, streaming=True)
+        xvg.parse_blocksize = 64
+        counts, edges = xvg.histogram(bins=12)
+        ref_counts, ref_edges = XVG(xvgfile).histogram(bins=12)
+        assert_array_equal(counts, ref_counts)
+        assert_array_equal(edges, ref_edges)
+
+    def test_pmf(self, xvgfile):
+        xvg = XVG(xvgfile)
+        F, x = xvg.pmf(bins=30, range=(-1, 5), temperature=300)
+        P, edges = xvg.histogram(bins=30, range=(-1, 5), density=True)
+        assert_array_almost_equal(x, 0.5 * (edges[:, 1:] + edges[:, :-1]))
+        assert_array_almost_equal(np.nanmin(np.where(np.isinf(F), np.nan, F), axis=1), [0, 0])
+        assert np.all(np.isinf(F[P == 0]))
+        i = np.argmax(P[0])
+        j = np.flatnonzero(P[0])[0]
+        assert_almost_equal(F[0, j], -0.0083144621 * 300 * np.log(P[0, j] / P[0, i]))
+
+
+class TestXVG_resample(object):
+    def setup_method(self):
+        t = np.r_[np.arange(0, 50, 0.5), np.arange(50, 100, 2.0)]   # irregular spacing
+        self.t = t
+        self.x = XVG(array=np.vstack([t, 2 * t + 1, np.sin(t)]), names="a,b")
+
+    def test_linear(self):
+        new = self.x.resample(dt=0.7)
+        t = np.arange(0, 98.01, 0.7)
+        assert_array_almost_equal(new.array[0], t)
+        assert_array_almost_equal(new.array[1], 2 * t + 1)
+        assert_array_almost_equal(new.array[2], np.interp(t, self.t, np.sin(self.t)))
+        assert_equal(new.names, ["a", "b"])
+
+    def test_nearest(self):
+        new_time = np.array([0.2, 0.3, 51., 51.2, 97.9])
+        new = self.x.resample(new_time=new_time, method="nearest")
+        assert_array_almost_equal(new.array[1], 2 * np.array([0., 0.5, 50., 52., 98.]) + 1)
+
+    def test_mean(self):
+        new = self.x.resample(dt=5, method="mean")
+        t = new.array[0]
+        inbin = lambda i: (self.t >= t[i] - 2.5) & (self.t < t[i] + 2.5)
+        for i in [0, 3, 12]:
+            assert_almost_equal(new.array[2, i], np.sin(self.t[inbin(i)]).mean())
+
+    def test_outside(self):
+        new = self.x.resample(new_time=[-1., 10., 200.])
+        assert np.all(np.isnan(new.array[1:, [0, 2]]))
+        assert_array_almost_equal(new.array[1, 1], 21.)
+
+    def test_original_unchanged(self):
+        a = self.x.array
+        self.x.resample(dt=1.)
+        assert self.x.array is a
+
+
+class TestXVG_rolling(object):
+    @staticmethod
+    def windows(data, window):
+        n = data.shape[1] - window + 1
+        return np.array([data[1:, i:i + window] for i in range(n)])   # (n, ncol, window)
+
+    @pytest.mark.parametrize("stat", ["mean", "var", "std", "min", "max"])
+    @pytest.mark.parametrize("window", [1, 4, 25])
+    def test_stat(self, data, stat, window):
+        rolled = XVG(array=data).rolling(window, stat)
+        reference = getattr(np, stat)(self.windows(data, window), axis=-1).T
+        assert_array_equal(rolled.array[0], data[0, window - 1:])
+        assert_array_almost_equal(rolled.array[1:], reference)
+
+    @pytest.mark.parametrize("stat", ["mean", "max"])
+    def test_nonfinite_local(self, data, stat):
+        data[1, 100] = np.nan
+        rolled = XVG(array=data).rolling(10, stat).array[1]
+        assert np.all(np.isnan(rolled[91:101]))
+        assert np.all(np.isfinite(np.delete(rolled, np.s_[91:101])))
+
+    @pytest.mark.parametrize("stat", ["mean", "var", "std"])
+    def test_nonfinite_moments(self, data, stat):
+        data[1, [100, 300, 310]] = np.nan, np.inf, -np.inf
+        data[2, [200, 205, 500]] = np.inf, np.inf, -np.inf
+        rolled = XVG(array=data).rolling(20, stat)
+        with np.errstate(invalid='ignore'):
+            reference = getattr(np, stat)(self.windows(data, 20), axis=-1).T
+        assert_array_almost_equal(rolled.array[1:], reference)
+
+    def test_streaming(self, xvgfile, data):
+        xvg = XVG(xvgfile, streaming=True)
+        xvg.parse_blocksize = 64
+        rolled = xvg.rolling(100, "std", nrows=30)
+        assert_array_almost_equal(rolled.array[1:], self.windows(data, 100).std(axis=-1).T)
+        assert xvg._XVG__array is None
+
+    def test_window_too_large(self, data):
+        assert XVG(array=data).rolling(2000).array.shape == (3, 0)
+
+    def test_bad_stat(self, data):
+        with pytest.raises(ValueError):
+            XVG(array=data).rolling(10, "median")
+
+
+class TestXVG_decimate_shape(object):
+    def setup_method(self):
+        t = np.arange(20000) * 0.01
+        y = np.random.RandomState(7).normal(size=(2, len(t)))
+        y[0, 12345] = 25.     # spike
+        y[1, 777] = -25.
+        self.data = np.vstack((t, y))
+        self.x = XVG(array=self.data)
+
+    def test_lttb(self):
+        a = self.x.decimate("lttb", self.data, maxpoints=500)
+        assert a.shape == (3, 500)
+        # original data points, first and last kept
+        idx = np.searchsorted(self.data[0], a[0])
+        assert_array_equal(a, self.data[:, idx])
+        assert idx[0] == 0 and idx[-1] == self.data.shape[1] - 1
+        assert 12345 in idx and 777 in idx
+
+    def test_lttb_single_column(self):
+        # hand-checked: the peak maximizes the triangle in the middle bucket
+        t = np.arange(7.)
+        y = np.array([0., 1., 0., 5., 0., 1., 0.])
+        a = self.x.decimate("lttb", np.vstack((t, y)), maxpoints=3)
+        assert_array_equal(a, [[0., 3., 6.], [0., 5., 0.]])
+
+    def test_minmax(self):
+        a = self.x.decimate("minmax", self.data, maxpoints=500)
+        assert a.shape == (3, 500)
+        assert_array_equal(a[1:].max(axis=1), self.data[1:].max(axis=1))
+        assert_array_equal(a[1:].min(axis=1), self.data[1:].min(axis=1))
+        assert_array_equal(a[0, 0::2], a[0, 1::2])
+
+    def test_minmax_order(self):
+        t = np.arange(8.)
+        y = np.array([0., 3., -1., 1., 2., -4., 0., 5.])
+        a = self.x.decimate("minmax", np.vstack((t, y)), maxpoints=4)
+        assert_array_equal(a[1], [3., -1., -4., 5.])
+
+
+class TestXVG_derived_cache(object):
+    @pytest.fixture
+    def xvg(self, data):
+        data[1, 5] = np.nan
+        return XVG(array=data)
+
+    def test_cached(self, xvg):
+        assert xvg.ma is xvg.ma
+        assert xvg.finite is xvg.finite
+        for stat in "mean", "std", "min", "max":
+            assert getattr(xvg, stat) is getattr(xvg, stat)
+
+    def test_readonly(self, xvg):
+        with pytest.raises(ValueError):
+            xvg.mean[0] = 0
+
+    def test_set_invalidates(self, xvg, data):
+        mean = xvg.mean
+        ma = xvg.ma
+        xvg.set(2 * data)
+        assert xvg.ma is not ma
+        assert_array_almost_equal(xvg.mean, 2 * mean)
+
+    def test_parse_invalidates(self, xvgfile, data):
+        xvg = XVG(xvgfile)
+        mean = xvg.mean
+        xvg.set(data[:, :10])
+        xvg.parse()
+        assert xvg.mean is not mean
+        assert_array_almost_equal(xvg.mean, mean)
+
+    def test_clear_cache(self, xvg):
+        mean = xvg.mean.copy()
+        xvg.array[1:] += 1
+        assert_array_almost_equal(xvg.mean, mean)
+        xvg.clear_cache()
+        assert_array_almost_equal(xvg.mean, mean + 1)
+
+    def test_packmask(self, data):
+        data[2, 7] = np.inf
+        xvg = XVG(array=data, packmask=True)
+        assert_array_equal(xvg.finite, np.isfinite(data))
+        assert xvg.finite.dtype == bool
+        assert_array_equal(xvg.ma.mask, ~np.isfinite(data))
+        assert xvg._XVG__derived['finitebits'].nbytes == (data.size + 7) // 8
+
+    def test_pickle(self, xvg):
+        import pickle
+        xvg.ma
+        x = pickle.loads(pickle.dumps(xvg))
+        assert x._XVG__derived == {}
+
+    def test_copies_independent(self, xvg, data):
+        import copy, pickle
+        xvg.mean
+        copies = [copy.copy(xvg), copy.copy(xvg), pickle.loads(pickle.dumps(xvg))]
+        for i, x in enumerate(copies):
+            x.set((i + 2) * data)
+            x.mean
+        for i, x in enumerate(copies):
+            assert_array_almost_equal(x.mean, (i + 2) * xvg.mean)
+
+
+class TestXVG_column_major(object):
+    @pytest.mark.parametrize('stride', [1, 3])
+    def test_parse_contiguous(self, xvgfile, data, stride):
+        xvg = XVG(xvgfile, stride=stride)
+        xvg.parse_blocksize = 64
+        assert_array_equal(xvg.array, data[:, ::stride])
+        assert xvg.array.flags['C_CONTIGUOUS']
+
+    @pytest.mark.parametrize('inplace', [True, False])
+    @pytest.mark.parametrize('capacity', [1, 7, 5000])
+    def test_buffer(self, data, inplace, capacity):
+        buf = _ColumnBuffer(3, capacity=capacity, inplace=inplace)
+        for start in range(0, 1000, 99):
+            buf.append(data[:, start:start + 99].T)
+        assert_array_equal(buf.array, data)
+        a = buf.trim()
+        assert_array_equal(a, data)
+        assert a.flags['C_CONTIGUOUS']
+
+
+class TestXVG_peek(object):
+    def test_peek(self, xvgfile, data):
+        info = XVG.peek(xvgfile)
+        assert_equal(info['names'], ["Potential", "Pressure"])
+        assert_equal(info['xaxis'], "Time (ps)")
+        assert_equal(info['yaxis'], "(kJ/mol)")
+        assert_equal(info['ncols'], 3)
+        assert_equal(info['t_first'], data[0, 0])
+        assert_equal(info['t_last'], data[0, -1])
+        assert abs(info['nrows'] - data.shape[1]) < 0.05 * data.shape[1]
+
+    def test_usecols(self, xvgfile, data):
+        info = XVG.peek(xvgfile, usecols=[0, 2])
+        assert_equal(info['names'], ["Pressure"])
+        assert_equal(info['ncols'], 2)
+
+    def test_trailing_garbage(self, tmpdir, data):
+        filename = write_xvg(tmpdir.join("running.xvg"), data[:, :10])
+        with open(filename, "a") as f:
+            f.write("\n# done\n12.5 1.0")   # incomplete line
+        info = XVG.peek(filename)
+        assert_equal(info['t_last'], data[0, 9])
+
+    def test_crlf(self, tmpdir, data):
+        header = "".join("# comment {0:d}\n".format(i) for i in range(200)) + XVG_HEADER
+        filename = write_xvg(tmpdir.join("dos.xvg"), data[:, :10], header=header)
+        with open(filename, "rb") as f:
+            text = f.read()
+        with open(filename, "wb") as f:
+            f.write(text.replace(b"\n", b"\r\n"))
+        info = XVG.peek(filename)
+        assert_equal(info['names'], ["Potential", "Pressure"])
+        assert_equal(info['t_last'], data[0, 9])
+        assert_equal(info['nrows'], 10)
+
+    def test_no_data(self, tmpdir):
+        filename = write_xvg(tmpdir.join("empty.xvg"), np.empty((3, 0)))
+        info = XVG.peek(filename)
+        assert_equal(info['nrows'], 0)
+        assert info['t_first'] is None
+        assert_equal(info['names'], ["Potential", "Pressure"])
+
+
+class TestXVG_serialization(object):
+    @pytest.fixture
+    def xvg(self, xvgfile):
+        xvg = XVG(xvgfile, savedata=True)
+        xvg.array
+        return xvg
+
+    def test_pickle_out_of_band(self, xvg):
+        import pickle
+        if pickle.HIGHEST_PROTOCOL < 5:
+            pytest.skip("pickle protocol 5 is not available")
+        buffers = []
+        s = pickle.dumps(xvg, protocol=5, buffer_callback=buffers.append)
+        assert len(buffers) == 1
+        assert len(s) < xvg.array.nbytes // 10
+        x = pickle.loads(s, buffers=buffers)
+        assert_array_equal(x.array, xvg.array)
+        assert np.shares_memory(x.array, np.asarray(buffers[0]))
+        assert_equal(x.names, xvg.names)
+
+    def test_pickle_caches(self, xvg):
+        import pickle
+        mean = xvg.mean
+        xvg.ma
+        xvg._acf(nstep=1)
+        x = pickle.loads(pickle.dumps(xvg))
+        assert_equal(sorted(x._XVG__derived), ["mean"])
+        assert_array_equal(x.mean, mean)
+        assert "acf" not in x._XVG__cache
+
+    def test_pickle_nodata(self, xvgfile, data):
+        import pickle
+        xvg = XVG(xvgfile)
+        xvg.mean
+        xvg.tc
+        xvg.block_average()
+        x = pickle.loads(pickle.dumps(xvg, protocol=pickle.HIGHEST_PROTOCOL))
+        assert x._XVG__array is None
+        assert_equal(x._XVG__derived, {})
+        assert_equal(x._XVG__cache, {})
+        assert_array_equal(x.array, data)
+        assert_array_almost_equal(x.mean, xvg.mean)
+
+    @pytest.mark.parametrize('savedata', [False, True])
+    def test_pickle_reader_state(self, xvgfile, data, savedata):
+        import pickle
+        xvg = XVG(xvgfile, savedata=savedata)
+        xvg.refresh()
+        xvg.read_window(10., 20.)
+        state = xvg.__getstate__()
+        assert "_XVG__tail" not in state
+        assert "_XVG__index" not in state
+        x = pickle.loads(pickle.dumps(xvg))
+        assert x._XVG__tail is None and x._XVG__index is None
+        assert_array_equal(x.array, data)
+
+    @pytest.mark.parametrize('compressed', [False, True])
+    def test_npz(self, tmpdir, xvg, compressed):
+        filename = str(tmpdir.join("energy.npz"))
+        xvg.metadata['note'] = "test"
+        mean, std = xvg.mean, xvg.std
+        blocking = xvg.block_average()
+        xvg.save_npz(filename, compressed=compressed)
+        x = XVG.load_npz(filename)
+        assert_array_equal(x.array, xvg.array)
+        assert_equal(x.names, xvg.names)
+        assert_equal(x.xaxis, xvg.xaxis)
+        assert_equal(x.metadata['note'], "test")
+        assert_equal(x.real_filename, xvg.real_filename)
+        assert_array_equal(x._XVG__derived['mean'], mean)
+        assert_array_equal(x.std, std)
+        for a, b in zip(x.block_average(), blocking):
+            assert_array_equal(a, b)
+        with np.load(filename, allow_pickle=False) as npz:
+            assert "stat_min" not in npz.files
+
+    def test_npz_streaming_stats(self, tmpdir, xvgfile, data):
+        filename = str(tmpdir.join("energy.npz"))
+        xvg = XVG(xvgfile, streaming=True)
+        mean = xvg.mean
+        xvg.save_npz(filename)
+        x = XVG.load_npz(filename)
+        assert_array_equal(x._XVG__derived['mean'], mean)
+        assert_array_equal(x.array, data)
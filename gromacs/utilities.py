@@ -97,6 +97,12 @@ import errno
 import subprocess
 from contextlib import contextmanager
 import bz2, gzip
+try:
+    import lzma
+    _LZMAError = lzma.LZMAError
+except ImportError:
+    lzma = None
+    _LZMAError = IOError
 import datetime
 import numpy
 
@@ -166,7 +172,11 @@ def openany(datasource, mode='r', **kwargs):
         stream.close()
 
 def anyopen(datasource, mode='r', **kwargs):
-    """Open datasource (gzipped, bzipped, uncompressed) and return a stream.
+    """Open datasource (gzipped, bzipped, xz, uncompressed) and return a stream.
+
+    The compression is determined from the extension of the filename
+    (``.gz``, ``.bz2`` or ``.xz``) when writing; when reading, the
+    handlers are tried in turn. Support for xz requires :mod:`lzma`.
 
     :Arguments:
        *datasource*
@@ -180,6 +190,8 @@ def anyopen(datasource, mode='r', **kwargs):
 
     """
     handlers = {'bz2': bz2.BZ2File, 'gz': gzip.open, '': file}
+    if lzma is not None:
+        handlers['xz'] = lzma.open
 
     if mode.startswith('r'):
         if hasattr(datasource,'next') or hasattr(datasource,'readline'):
@@ -191,7 +203,9 @@ def anyopen(datasource, mode='r', **kwargs):
         else:
             stream = None
             filename = datasource
-            for ext in ('bz2', 'gz', ''):   # file == '' should be last
+            for ext in ('bz2', 'gz', 'xz', ''):   # file == '' should be last
+                if ext not in handlers:
+                    continue
                 openfunc = handlers[ext]
                 stream = _get_stream(datasource, openfunc, mode=mode, **kwargs)
                 if stream is not None:
@@ -211,8 +225,8 @@ def anyopen(datasource, mode='r', **kwargs):
             name, ext = os.path.splitext(filename)
             if ext.startswith(os.path.extsep):
                 ext = ext[1:]
-            if not ext in ('bz2', 'gz'):
-                ext = ''   # anything else but bz2 or gz is just a normal file
+            if not ext in handlers:
+                ext = ''   # anything else but bz2, gz or xz is just a normal file
             openfunc = handlers[ext]
             stream = openfunc(datasource, mode=mode, **kwargs)
             if stream is None:
@@ -232,7 +246,7 @@ def _get_stream(filename, openfunction=file, mode='r'):
         stream.readline()
         stream.close()
         stream = openfunction(filename,'r')
-    except IOError:
+    except (IOError, _LZMAError):
         stream.close()
         stream = None
     return stream
@@ -55,7 +55,7 @@ setup(name="GromacsWrapper",
                                 'tests/data/*.log',
                                 ],
                     },
-      install_requires = ['numpy>=1.0',
+      install_requires = ['numpy>=1.16',
                           'six',          # towards py 3 compatibility
                           'numkit',       # numerical helpers
                           ],              # basic package (w/o analysis)